@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+
+API_BASE = os.environ.get("VAYU_API_BASE", "https://api.airgradient.com/public/api/v1")
+
+# (connect, read) timeouts in seconds so a hung upstream can't block a worker
+API_TIMEOUT = (3.05, 10)
+MAX_RETRIES = 2
+BACKOFF = 0.5
+MAX_WORKERS = int(os.environ.get("VAYU_FETCH_WORKERS", "8"))
+
+# Status codes worth retrying; anything else is reported straight away
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Circuit breaker: after this many failed fetches in a row a station is left alone for a
+# cool-down that doubles on every failed trial, up to the maximum
+BREAKER_THRESHOLD = 3
+BREAKER_RESET = 30
+BREAKER_MAX_RESET = 600
+
+_local = {"pid": None, "session": None, "executor": None}
+_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+# Per-station circuit breaker. Closed: requests flow. Open: requests fail fast without touching
+# the network. After the cool-down one trial request is let through (half-open); its outcome
+# closes the circuit or re-opens it for longer.
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset=BREAKER_RESET, max_reset=BREAKER_MAX_RESET):
+        self.threshold = threshold
+        self.reset = reset
+        self.max_reset = max_reset
+        self.failures = 0
+        self.opened_until = None
+        self.cooldown = reset
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_until is None:
+            return "closed"
+        return "half-open" if time.time() >= self.opened_until else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_until is None:
+                return True
+            if time.time() < self.opened_until or self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_until = None
+            self.cooldown = self.reset
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running:
+                self.cooldown = min(self.cooldown * 2, self.max_reset)
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_until = time.time() + self.cooldown
+            self.trial_running = False
+
+
+_breakers = {}
+
+
+def breaker_for(location_id):
+    with _lock:
+        if location_id not in _breakers:
+            _breakers[location_id] = CircuitBreaker()
+        return _breakers[location_id]
+
+
+# Current breaker state per station, e.g. {"72192": "closed"}
+def breaker_states():
+    with _lock:
+        breakers = dict(_breakers)
+    return {location_id: breaker.state for location_id, breaker in breakers.items()}
+
+
+def location_url(location_id):
+    return f"{API_BASE}/world/locations/{location_id}/measures/current"
+
+
+# One pooled session and thread pool per process, so keep-alive connections are reused
+def _resources():
+    with _lock:
+        if _local["pid"] != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _local.update(
+                pid=os.getpid(),
+                session=session,
+                executor=ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="vayu-fetch"),
+            )
+        return _local["session"], _local["executor"]
+
+
+# Fetch the current measurement of one location, retrying transient failures with backoff.
+# Fails fast with CircuitOpenError while the station's circuit is open.
+def fetch_location(location_id, timeout=API_TIMEOUT, retries=MAX_RETRIES, backoff=BACKOFF):
+    breaker = breaker_for(location_id)
+    if not breaker.allow():
+        metrics.inc("vayu_upstream_requests_total", outcome="circuit_open")
+        raise CircuitOpenError(f"Circuit open for location {location_id}; skipping fetch")
+    start = time.perf_counter()
+    try:
+        data = _fetch_with_retries(location_id, timeout, retries, backoff)
+    except (requests.exceptions.RequestException, ValueError):
+        breaker.record_failure()
+        metrics.observe("vayu_upstream_seconds", time.perf_counter() - start, outcome="error")
+        metrics.inc("vayu_upstream_requests_total", outcome="error")
+        raise
+    breaker.record_success()
+    metrics.observe("vayu_upstream_seconds", time.perf_counter() - start, outcome="ok")
+    metrics.inc("vayu_upstream_requests_total", outcome="ok")
+    return data
+
+
+def _fetch_with_retries(location_id, timeout, retries, backoff):
+    session, _ = _resources()
+    attempt = 0
+    while True:
+        try:
+            response = session.get(location_url(location_id), timeout=timeout)
+            if response.status_code in RETRY_STATUS and attempt < retries:
+                raise requests.exceptions.HTTPError(f"{response.status_code} from upstream", response=response)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError) as e:
+            status = e.response.status_code if e.response is not None else None
+            if attempt >= retries or (status is not None and status not in RETRY_STATUS):
+                raise
+            # Exponential backoff with jitter so workers don't retry in lockstep
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+
+# Fetch many locations concurrently. Returns ({id: payload}, {id: error message});
+# one slow or failing station doesn't hold back or sink the others.
+def fetch_locations(stations, fetch=fetch_location):
+    _, executor = _resources()
+    futures = {
+        station["id"]: executor.submit(fetch, station["id"], station.get("timeout", API_TIMEOUT))
+        for station in stations
+    }
+    results, errors = {}, {}
+    for station_id, future in futures.items():
+        try:
+            results[station_id] = future.result()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            errors[station_id] = str(e)
+    return results, errors
@@ -0,0 +1,287 @@
+import abc
+import math
+import os
+import queue
+import smtplib
+import threading
+from collections import namedtuple
+from email.message import EmailMessage
+
+import requests
+
+import metrics
+import store
+from aqi import CATEGORIES, pm25_aqi
+from stations import STATIONS_BY_ID
+
+
+# A rule that changed state for a station: kind is "raised" or "cleared"
+Alert = namedtuple("Alert", ["station", "rule", "kind", "level", "message", "value", "ts"])
+
+# A rule that fired is not raised again at the same level for this long, so a reading
+# hovering around a threshold doesn't page anyone every poll
+COOLDOWN = int(os.environ.get("VAYU_ALERT_COOLDOWN", str(60 * 60)))
+# How far below its threshold an average must fall before a sustained alert clears
+HYSTERESIS = 0.1
+# Alerts waiting for a sink; beyond this they are dropped (and counted) rather than piling up
+QUEUE_SIZE = 1000
+
+metrics.REGISTRY.describe("vayu_alerts_total", "counter", "Alerts sent by rule and kind")
+metrics.REGISTRY.describe("vayu_alert_delivery_errors_total", "counter", "Alert deliveries that failed, by sink")
+
+
+# Rules are evaluated once per ingested reading and keep a few numbers of state per station
+# (stored as JSON), so nothing is rescanned. step() updates the state and returns a severity
+# level (0 = fine) plus a message; evaluate() turns level changes into raised/cleared alerts.
+class Rule(abc.ABC):
+    def __init__(self, name, cooldown=COOLDOWN):
+        self.name = name
+        self.cooldown = cooldown
+
+    # Fold one reading into `state` (the previous reading's time is state["ts"], if any)
+    # and return (level, message)
+    @abc.abstractmethod
+    def step(self, state, ts, pm25):
+        ...
+
+    def evaluate(self, station, state, ts, pm25):
+        # Readings arrive once per worker poll; anything not newer was already seen
+        if state.get("ts") is not None and ts <= state["ts"]:
+            return state, None
+        level, message = self.step(state, ts, pm25)
+        previous = state.get("level", 0)
+        state.update(ts=ts, level=level)
+        alert = None
+        if level > previous:
+            # Escalations always go out; a new episode only once the cooldown has passed
+            raised_at = state.get("raised_at")
+            if (state.get("open") and level > state.get("raised_level", 0)) or \
+                    raised_at is None or ts - raised_at >= self.cooldown:
+                state.update(open=True, raised_at=ts, raised_level=level)
+                alert = Alert(station, self.name, "raised", level, message, pm25, ts)
+        elif level == 0 and previous > 0 and state.get("open"):
+            state["open"] = False
+            alert = Alert(station, self.name, "cleared", 0, message, pm25, ts)
+        return state, alert
+
+
+# AQI category transitions. A new category counts once `confirm` readings in a row agree;
+# level is the category index above `min_category`, so each worsening step alerts again.
+class CategoryRule(Rule):
+    def __init__(self, name="category", min_category="Unhealthy for Sensitive Groups", confirm=2, **kwargs):
+        super().__init__(name, **kwargs)
+        self.min_code = CATEGORIES.index(min_category)
+        self.confirm = confirm
+
+    def step(self, state, ts, pm25):
+        category = pm25_aqi(pm25).category
+        code = CATEGORIES.index(category)
+        if state.get("candidate") == code:
+            state["count"] += 1
+        else:
+            state.update(candidate=code, count=1)
+        if state["count"] >= self.confirm or "category" not in state:
+            state["category"] = code
+        current = state["category"]
+        level = current - self.min_code + 1 if current >= self.min_code else 0
+        return level, f"AQI category is {CATEGORIES[current]} (PM2.5 {pm25:.1f} µg/m³)"
+
+
+# Sustained pollution: an exponentially weighted average over `window` seconds above
+# `threshold`. Clears once the average drops HYSTERESIS below the threshold.
+class SustainedRule(Rule):
+    def __init__(self, name="sustained", threshold=55.5, window=60 * 60, **kwargs):
+        super().__init__(name, **kwargs)
+        self.threshold = threshold
+        self.window = window
+
+    def step(self, state, ts, pm25):
+        dt = ts - state["ts"] if state.get("ts") is not None else None
+        if dt is None or dt > self.window:
+            state.update(average=pm25, span=0)
+        else:
+            weight = 1 - math.exp(-dt / self.window)
+            state["average"] += weight * (pm25 - state["average"])
+            state["span"] = min(state["span"] + dt, self.window)
+        average = state["average"]
+        if state.get("level"):
+            level = int(average >= self.threshold * (1 - HYSTERESIS))
+        else:
+            level = int(state["span"] >= self.window and average >= self.threshold)
+        return level, (f"PM2.5 averaged {average:.1f} µg/m³ over the last {self.window // 60} minutes "
+                       f"(threshold {self.threshold:g})")
+
+
+# Rapid rise: smoothed rate of change of PM2.5, in µg/m³ per hour, above `rate`.
+# The rate is averaged over `window` seconds so a single noisy sample doesn't trigger it.
+class RiseRule(Rule):
+    def __init__(self, name="rise", rate=30.0, window=15 * 60, **kwargs):
+        super().__init__(name, **kwargs)
+        self.rate = rate
+        self.window = window
+
+    def step(self, state, ts, pm25):
+        dt = ts - state["ts"] if state.get("ts") is not None else None
+        if dt is None or dt > self.window:
+            state.update(last=pm25, slope=0.0)
+        else:
+            weight = 1 - math.exp(-dt / self.window)
+            state["slope"] += weight * ((pm25 - state["last"]) / dt * 3600 - state["slope"])
+            state["last"] = pm25
+        slope = state["slope"]
+        limit = self.rate / 2 if state.get("level") else self.rate
+        return int(slope >= limit), f"PM2.5 rising {slope:.1f} µg/m³ per hour (now {pm25:.1f})"
+
+
+RULES = [CategoryRule(), SustainedRule(), RiseRule()]
+
+
+def describe(alert):
+    name = STATIONS_BY_ID.get(alert.station, {}).get("name", alert.station)
+    prefix = "Cleared" if alert.kind == "cleared" else "Alert"
+    return f"{prefix} [{alert.rule}] {name}: {alert.message}"
+
+
+class LogSink:
+    name = "log"
+
+    def send(self, alert):
+        print(describe(alert))
+
+
+# POSTs each alert as JSON
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url, timeout=(3.05, 10)):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        payload = {**alert._asdict(), "text": describe(alert)}
+        requests.post(self.url, json=payload, timeout=self.timeout).raise_for_status()
+
+
+class EmailSink:
+    name = "email"
+
+    def __init__(self, host, port, sender, recipients, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.timeout = timeout
+
+    def send(self, alert):
+        message = EmailMessage()
+        message["Subject"] = describe(alert)
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(describe(alert))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+
+# Sinks from the environment: always the log, plus VAYU_ALERT_WEBHOOK and
+# VAYU_ALERT_SMTP (host:port) with VAYU_ALERT_EMAIL_FROM / VAYU_ALERT_EMAIL_TO (comma-separated)
+def configured_sinks():
+    sinks = [LogSink()]
+    if os.environ.get("VAYU_ALERT_WEBHOOK"):
+        sinks.append(WebhookSink(os.environ["VAYU_ALERT_WEBHOOK"]))
+    if os.environ.get("VAYU_ALERT_SMTP") and os.environ.get("VAYU_ALERT_EMAIL_TO"):
+        host, _, port = os.environ["VAYU_ALERT_SMTP"].partition(":")
+        sinks.append(EmailSink(
+            host, int(port or 25),
+            os.environ.get("VAYU_ALERT_EMAIL_FROM", "vayu@localhost"),
+            [address.strip() for address in os.environ["VAYU_ALERT_EMAIL_TO"].split(",")],
+        ))
+    return sinks
+
+
+def send(alert, sinks):
+    for sink in sinks:
+        try:
+            sink.send(alert)
+        except Exception as e:
+            metrics.inc("vayu_alert_delivery_errors_total", sink=sink.name)
+            print(f"Error sending alert via {sink.name}: {e}")
+
+
+# Sends alerts to its sinks from a background thread, so a slow webhook or SMTP server never
+# holds up the poller that raised them. The thread starts on first use in each process.
+class Dispatcher:
+    def __init__(self, sinks, maxsize=QUEUE_SIZE):
+        self.sinks = sinks
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so each worker starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(self.maxsize)
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, args=(self._queue,), name="vayu-alerts", daemon=True).start()
+            return self._queue
+
+    def _run(self, pending):
+        while True:
+            alert = pending.get()
+            try:
+                send(alert, self.sinks)
+            finally:
+                pending.task_done()
+
+    def submit(self, alerts):
+        if not alerts:
+            return
+        pending = self._ensure_started()
+        for alert in alerts:
+            try:
+                pending.put_nowait(alert)
+            except queue.Full:
+                metrics.inc("vayu_alert_delivery_errors_total", sink="queue")
+                print(f"Alert queue full; dropping: {describe(alert)}")
+
+    # Block until every alert submitted so far has been handed to the sinks
+    def join(self):
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+
+DISPATCHER = Dispatcher(configured_sinks())
+
+
+def deliver(alerts, dispatcher=None):
+    for alert in alerts:
+        metrics.inc("vayu_alerts_total", rule=alert.rule, kind=alert.kind)
+    (DISPATCHER if dispatcher is None else dispatcher).submit(alerts)
+
+
+# Run every rule on one newly stored reading and queue whatever fired; returns the alerts.
+# Called only by the worker whose insert stored the reading, so each reading is evaluated once.
+def evaluate_reading(station, data, rules=None, dispatcher=None):
+    try:
+        pm25 = float(data.get("pm02"))
+    except (TypeError, ValueError):
+        return []
+    if math.isnan(pm25) or pm25 < 0:
+        return []
+    ts = store.parse_timestamp(data.get("timestamp"))
+    if ts is None:
+        return []
+    rules = RULES if rules is None else rules
+
+    def update(states):
+        fired = []
+        for rule in rules:
+            states[rule.name], alert = rule.evaluate(station, dict(states.get(rule.name, {})), ts, pm25)
+            if alert is not None:
+                fired.append(alert)
+        return states, fired
+
+    alerts = store.update_alert_states(station, update)
+    deliver(alerts, dispatcher)
+    return alerts
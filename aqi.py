@@ -0,0 +1,170 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+# US EPA AQI categories, in index order
+CATEGORIES = [
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous",
+]
+CATEGORY_COLORS = ["Green", "Yellow", "Orange", "Red", "Purple", "Maroon"]
+CATEGORY_HEX = ["#00e400", "#ffff00", "#ff7e00", "#ff0000", "#8f3f97", "#7e0023"]
+
+# Index range covered by each category
+INDEX_LOW = np.array([0, 51, 101, 151, 201, 301], dtype=float)
+INDEX_HIGH = np.array([50, 100, 150, 200, 300, 500], dtype=float)
+
+# Concentration breakpoints per pollutant; row i covers category i (Good, Moderate, ...).
+# Concentrations are truncated to `decimals` places before bucketing.
+BREAKPOINTS = {
+    "pm25": {
+        "label": "PM2.5", "unit": "µg/m³", "averaging": "24-hour", "decimals": 1,
+        "low": np.array([0.0, 12.1, 35.5, 55.5, 150.5, 250.5]),
+        "high": np.array([12.0, 35.4, 55.4, 150.4, 250.4, 500.4]),
+    },
+    "pm10": {
+        "label": "PM10", "unit": "µg/m³", "averaging": "24-hour", "decimals": 0,
+        "low": np.array([0.0, 55, 155, 255, 355, 425]),
+        "high": np.array([54.0, 154, 254, 354, 424, 604]),
+    },
+    # 8-hour ozone has no Hazardous row; higher values extend the Very Unhealthy segment
+    "o3": {
+        "label": "O₃", "unit": "ppb", "averaging": "8-hour", "decimals": 0,
+        "low": np.array([0.0, 55, 71, 86, 106]),
+        "high": np.array([54.0, 70, 85, 105, 200]),
+    },
+    "no2": {
+        "label": "NO₂", "unit": "ppb", "averaging": "1-hour", "decimals": 0,
+        "low": np.array([0.0, 54, 101, 361, 650, 1250]),
+        "high": np.array([53.0, 100, 360, 649, 1249, 2049]),
+    },
+    "co": {
+        "label": "CO", "unit": "ppm", "averaging": "8-hour", "decimals": 1,
+        "low": np.array([0.0, 4.5, 9.5, 12.5, 15.5, 30.5]),
+        "high": np.array([4.4, 9.4, 12.4, 15.4, 30.4, 50.4]),
+    },
+    "so2": {
+        "label": "SO₂", "unit": "ppb", "averaging": "1-hour", "decimals": 0,
+        "low": np.array([0.0, 36, 76, 186, 305, 605]),
+        "high": np.array([35.0, 75, 185, 304, 604, 1004]),
+    },
+}
+PM25_BREAKPOINTS = BREAKPOINTS["pm25"]
+
+AQIResult = namedtuple("AQIResult", ["aqi", "category"])
+MultiAQIResult = namedtuple("MultiAQIResult", ["aqi", "category", "dominant", "sub_indices"])
+
+
+# Truncate (not round) concentrations the way the EPA tables expect
+def truncate(values, decimals):
+    scale = 10.0 ** decimals
+    # The small epsilon keeps values like 12.1 (stored as 12.0999...) in their bucket
+    return np.floor(values * scale + 1e-9) / scale
+
+
+def _as_float(values):
+    if isinstance(values, pd.Series):
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    return np.asarray(values, dtype=float)
+
+
+def _wrap(values, aqi, codes):
+    # Code -1 (missing/invalid) picks the trailing None
+    categories = np.array(CATEGORIES + [None], dtype=object)[np.atleast_1d(codes)]
+    if isinstance(values, pd.Series):
+        return AQIResult(
+            pd.Series(aqi, index=values.index, name=values.name),
+            pd.Series(pd.Categorical(categories, categories=CATEGORIES, ordered=True), index=values.index),
+        )
+    if np.ndim(values) == 0:
+        value = float(aqi)
+        return AQIResult(None if np.isnan(value) else value, categories[0])
+    return AQIResult(aqi, categories.reshape(np.shape(codes)))
+
+
+def _linear_aqi(concentrations, breakpoints):
+    concentrations = truncate(concentrations, breakpoints["decimals"])
+    low, high = breakpoints["low"], breakpoints["high"]
+    bucket = np.clip(np.searchsorted(low, concentrations, side="right") - 1, 0, len(low) - 1)
+
+    c_low, c_high = low[bucket], high[bucket]
+    i_low, i_high = INDEX_LOW[bucket], INDEX_HIGH[bucket]
+    aqi = (i_high - i_low) / (c_high - c_low) * (concentrations - c_low) + i_low
+
+    invalid = np.isnan(concentrations) | (concentrations < 0)
+    return np.where(invalid, np.nan, aqi)
+
+
+# Piecewise-linear AQI for one pollutant; returns (index, category) for scalars or arrays.
+# Values above the top breakpoint extend the last segment; negative or missing values give NaN.
+def compute_aqi(values, breakpoints):
+    aqi = _linear_aqi(_as_float(values), breakpoints)
+    return _wrap(values, aqi, category_codes(aqi))
+
+
+# US AQI from PM2.5 concentrations
+def pm25_aqi(values):
+    return compute_aqi(values, PM25_BREAKPOINTS)
+
+
+# Sub-indices for several pollutants at once, plus the overall index and the pollutant driving it.
+# `concentrations` maps BREAKPOINTS keys to scalars/arrays, or is a DataFrame with those columns.
+def multi_pollutant_aqi(concentrations):
+    names = [name for name in BREAKPOINTS if name in concentrations]
+    if not names:
+        raise ValueError(f"Expected at least one of {', '.join(BREAKPOINTS)}")
+    columns = np.broadcast_arrays(*[_as_float(concentrations[name]) for name in names])
+    stacked = np.stack([_linear_aqi(column, BREAKPOINTS[name]) for name, column in zip(names, columns)])
+
+    missing = np.isnan(stacked).all(axis=0)
+    dominant_idx = np.argmax(np.where(np.isnan(stacked), -np.inf, stacked), axis=0)
+    aqi = np.where(missing, np.nan, np.take_along_axis(stacked, dominant_idx[None], axis=0)[0])
+    dominant_codes = np.where(missing, -1, dominant_idx)
+    dominant = np.array(names + [None], dtype=object)[np.atleast_1d(dominant_codes)].reshape(dominant_codes.shape)
+    category = _wrap(aqi, aqi, category_codes(aqi)).category
+
+    if isinstance(concentrations, pd.DataFrame):
+        index = concentrations.index
+        return MultiAQIResult(
+            pd.Series(aqi, index=index),
+            pd.Series(pd.Categorical(category, categories=CATEGORIES, ordered=True), index=index),
+            pd.Series(dominant, index=index),
+            pd.DataFrame(dict(zip(names, stacked)), index=index),
+        )
+    if aqi.ndim == 0:
+        value = float(aqi)
+        return MultiAQIResult(
+            None if np.isnan(value) else value,
+            category,
+            dominant.item(),
+            {name: (None if np.isnan(sub) else float(sub)) for name, sub in zip(names, stacked)},
+        )
+    return MultiAQIResult(aqi, category, dominant, dict(zip(names, stacked)))
+
+
+# Category index (0 = Good ... 5 = Hazardous) for AQI values, -1 where missing
+def category_codes(aqi):
+    aqi = _as_float(aqi)
+    codes = np.clip(np.searchsorted(INDEX_HIGH, aqi, side="left"), 0, len(CATEGORIES) - 1)
+    return np.where(np.isnan(aqi) | (aqi < 0), -1, codes)
+
+
+# JSON-ready copy of the tables, for code that computes the AQI in the browser
+def breakpoint_tables():
+    return {
+        "categories": CATEGORIES,
+        "colors": CATEGORY_COLORS,
+        "index_low": INDEX_LOW.tolist(),
+        "index_high": INDEX_HIGH.tolist(),
+        "pollutants": {
+            name: {"label": table["label"], "decimals": table["decimals"],
+                   "low": table["low"].tolist(), "high": table["high"].tolist()}
+            for name, table in BREAKPOINTS.items()
+        },
+    }
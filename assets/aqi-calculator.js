@@ -0,0 +1,99 @@
+// Browser port of aqi.py for the AQI calculator. Breakpoint tables come from the server
+// (aqi.breakpoint_tables) through the 'aqi-breakpoints' store, so the numbers can't drift;
+// fixtures/aqi_cases.json holds cases both implementations must agree on.
+(function () {
+    // Truncate (not round) concentrations the way the EPA tables expect
+    function truncate(value, decimals) {
+        var scale = Math.pow(10, decimals);
+        return Math.floor(value * scale + 1e-9) / scale;
+    }
+
+    // Piecewise-linear sub-index for one pollutant; null for missing or negative values
+    function linearAqi(value, table, tables) {
+        if (value === null || value === undefined || value === '' || isNaN(value)) {
+            return null;
+        }
+        var c = truncate(Number(value), table.decimals);
+        if (c < 0) {
+            return null;
+        }
+        // Last row whose lower bound is <= c; values past the top extend the last segment
+        var bucket = 0;
+        for (var i = 0; i < table.low.length; i++) {
+            if (table.low[i] <= c) {
+                bucket = i;
+            }
+        }
+        var cLow = table.low[bucket], cHigh = table.high[bucket];
+        var iLow = tables.index_low[bucket], iHigh = tables.index_high[bucket];
+        return (iHigh - iLow) / (cHigh - cLow) * (c - cLow) + iLow;
+    }
+
+    // Category index for an AQI value: the first category whose upper bound is >= aqi
+    function categoryCode(aqi, tables) {
+        var high = tables.index_high;
+        for (var i = 0; i < high.length; i++) {
+            if (aqi <= high[i]) {
+                return i;
+            }
+        }
+        return high.length - 1;
+    }
+
+    // Overall AQI: the highest sub-index, and the pollutant driving it
+    function multiPollutantAqi(concentrations, tables) {
+        var result = {aqi: null, category: null, dominant: null, sub_indices: {}};
+        Object.keys(tables.pollutants).forEach(function (name) {
+            if (!(name in concentrations)) {
+                return;
+            }
+            var sub = linearAqi(concentrations[name], tables.pollutants[name], tables);
+            result.sub_indices[name] = sub;
+            if (sub !== null && (result.aqi === null || sub > result.aqi)) {
+                result.aqi = sub;
+                result.dominant = name;
+            }
+        });
+        if (result.aqi !== null) {
+            result.category = tables.categories[categoryCode(result.aqi, tables)];
+        }
+        return result;
+    }
+
+    function component(type, children, props) {
+        return {namespace: 'dash_html_components', type: type,
+                props: Object.assign({children: children}, props || {})};
+    }
+
+    // Same output as the old server-side calculate_aqi callback
+    function calculate(nClicks, pm25, pm10, tables) {
+        if (nClicks === null || nClicks === undefined || pm25 === null || pm25 === undefined || pm10 === null || pm10 === undefined || !tables) {
+            return '';
+        }
+        var result = multiPollutantAqi({pm25: pm25, pm10: pm10}, tables);
+        var subs = result.sub_indices;
+        if (result.aqi === null || subs.pm25 === null || subs.pm10 === null) {
+            return component('P', 'Unable to calculate AQI. Please enter valid inputs.', {className: 'text-center'});
+        }
+        var color = tables.colors[tables.categories.indexOf(result.category)];
+        return component('Div', [
+            component('P', 'Calculated AQI: ' + result.aqi.toFixed(2),
+                      {style: {'font-weight': 'bold', 'font-size': '20px'}}),
+            component('P', 'Category: ' + result.category,
+                      {style: {'color': color.toLowerCase(), 'font-size': '18px'}}),
+            component('P', 'PM2.5 AQI: ' + subs.pm25.toFixed(2) + ', PM10 AQI: ' + subs.pm10.toFixed(2),
+                      {style: {'font-size': '16px'}}),
+            component('P', 'Main pollutant: ' + tables.pollutants[result.dominant].label,
+                      {style: {'font-size': '16px'}})
+        ], {className: 'text-center'});
+    }
+
+    var api = {linearAqi: linearAqi, categoryCode: categoryCode, multiPollutantAqi: multiPollutantAqi,
+               calculate: calculate};
+    if (typeof window !== 'undefined') {
+        window.dash_clientside = Object.assign({}, window.dash_clientside, {aqi: api});
+    }
+    if (typeof module !== 'undefined') {
+        module.exports = api;
+    }
+})();
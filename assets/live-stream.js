@@ -0,0 +1,33 @@
+// Keeps the 'live-store' component in sync with the /stream server-sent events.
+// The server only sends stations whose reading changed, so deltas are merged here.
+(function () {
+    var state = {};
+
+    function publish() {
+        var dc = window.dash_clientside;
+        if (!dc || !dc.set_props) {
+            // Dash renderer not ready yet; try again shortly
+            setTimeout(publish, 250);
+            return;
+        }
+        dc.set_props('live-store', {data: state});
+    }
+
+    function connect() {
+        if (!window.EventSource) {
+            return;
+        }
+        var source = new EventSource('/stream');
+        source.onmessage = function (event) {
+            state = Object.assign({}, state, JSON.parse(event.data));
+            publish();
+        };
+        // EventSource reconnects by itself; the server resends full state on reconnect
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', connect);
+    } else {
+        connect();
+    }
+})();
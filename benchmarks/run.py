@@ -0,0 +1,231 @@
+"""Offline benchmarks for the Vayu app.
+
+Serves a recorded AirGradient response from a local stand-in, points the app at it and at
+throwaway cache/store paths, then times the data load, the main callbacks and the AQI maths.
+Results (timings in ms, payload sizes in bytes, memory in KiB) are written as JSON:
+
+    python benchmarks/run.py --output bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURE = os.path.join(BENCH_DIR, "airgradient_current.json")
+
+
+# Answers every /world/locations/<id>/measures/current request with the recorded fixture
+def start_stand_in(fixture=FIXTURE):
+    with open(fixture, "rb") as f:
+        body = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not self.path.endswith("/measures/current"):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def max_rss_kib():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def payload_size(value):
+    from plotly.io.json import to_json_plotly
+    return len(to_json_plotly(value).encode())
+
+
+# Run `func` `repeat` times; timings in ms plus the peak Python allocation of one call
+def measure(func, repeat, setup=None):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "peak_alloc_kib": peak // 1024,
+    }, result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Synthetic readings every two minutes, so the history views have something to downsample
+def seed_history(station_id, days, step=120):
+    import math
+    import store
+    end = int(time.time())
+    for ts in range(end - days * 86400, end, step):
+        pm25 = 35 + 25 * math.sin(ts / 86400 * 2 * math.pi) + 10 * math.sin(ts / 3700)
+        store.record(station_id, {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ts)),
+            "pm02": round(pm25, 1), "pm10": round(pm25 * 1.3, 1), "atmp": 20.0, "rhum": 60,
+        })
+
+
+def run(repeat, scale, history_days):
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="vayu-bench-")
+    server = start_stand_in()
+    # Must be set before the app modules read them at import time
+    os.environ["VAYU_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["VAYU_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["VAYU_STORE"] = os.path.join(workdir, "vayu.sqlite3")
+    os.environ["VAYU_POLL_INTERVAL"] = "3600"
+    os.environ.pop("VAYU_POLLUTION_REFRESH", None)
+    sys.path.insert(0, REPO_DIR)
+
+    rss_before = max_rss_kib()
+    start = time.perf_counter()
+    import new
+    results["import_app"] = {"ms": round((time.perf_counter() - start) * 1000, 3),
+                             "max_rss_kib": max_rss_kib(), "rss_growth_kib": max_rss_kib() - rss_before}
+
+    import numpy as np
+    import data
+    from aqi import pm25_aqi
+
+    # Dataset load: parsing the CSV versus reading the digest-keyed cache written by the import
+    results["read_pollution_csv"], _ = measure(lambda: data.read_pollution_csv(data.POLLUTION_CSV), repeat)
+    results["load_pollution_cached"], frame = measure(lambda: data.load_pollution(), repeat)
+    results["load_pollution_cached"]["rows"] = len(frame)
+    results["load_pollution_cached"]["frame_kib"] = int(frame.memory_usage(deep=True).sum()) // 1024
+
+    seed_history(new.STATION_ID, history_days)
+
+    # Upstream fetch through the stand-in, then every callback against the same snapshot
+    results["poller_refresh"], _ = measure(new.live_poller.refresh, repeat)
+    live = new.live_state(new.live_poller.snapshot())
+
+    callbacks = {
+        "update_dashboard": lambda: new.update_dashboard(live, new.STATION_ID, None),
+        "update_station_markers": lambda: new.update_station_markers(live, None, None),
+        "update_last_updated": lambda: new.update_last_updated(live, new.STATION_ID),
+        "update_forecast_outlook": lambda: new.update_forecast_outlook(live, new.STATION_ID, None),
+        "display_page_dashboard": lambda: new.display_page("/"),
+        "update_city_markers_world": lambda: new.update_city_markers([[-90, -180], [90, 180]], 2),
+        "update_explore_results": lambda: new.update_explore_results(None, "AQI Value", None, None, 100, None),
+    }
+    for pathname in new.STATIC_PAGES:
+        callbacks[f"display_page_{pathname.strip('/')}"] = lambda pathname=pathname: new.display_page(pathname)
+    for name, func in callbacks.items():
+        stats, output = measure(func, repeat)
+        stats["payload_bytes"] = payload_size(output)
+        results[name] = stats
+
+    # update_history reads the callback context, so its data path is timed directly
+    end = int(time.time())
+    for range_key in ("24h", "7d", "30d"):
+        stats, (frame, _, _) = measure(
+            lambda: new.history_series(new.STATION_ID, end - new.HISTORY_RANGES[range_key], end, 1200), repeat)
+        stats["points"] = len(frame)
+        results[f"history_series_{range_key}"] = stats
+
+    # The choropleth is cached per dataset version: time both the build and the cached path
+    stats, output = measure(lambda: new.build_choropleth_figure(data.pollution_version(), "AQI Value", "mean"), repeat)
+    stats["payload_bytes"] = payload_size(output)
+    results["build_choropleth_figure"] = stats
+    new.update_choropleth_map(None, "AQI Value", "mean")
+    stats, output = measure(lambda: new.update_choropleth_map(None, "AQI Value", "mean"), repeat)
+    stats["payload_bytes"] = payload_size(output)
+    results["update_choropleth_map_cached"] = stats
+
+    # Nearest-city lookups for uniformly spread points: the spatial index versus a full scan
+    from spatial import to_unit_vectors
+    rng = np.random.default_rng(0)
+    index = data.get_city_index()
+    queries = list(zip(np.degrees(np.arcsin(rng.uniform(-1, 1, 1000))), rng.uniform(-180, 180, 1000)))
+    stats, _ = measure(lambda: [index.nearest(lat, lon) for lat, lon in queries], max(1, repeat // 5))
+    stats["queries"] = len(queries)
+    results["nearest_city_index"] = stats
+    stats, _ = measure(lambda: [np.linalg.norm(index.xyz - to_unit_vectors(lat, lon), axis=1).argmin()
+                                for lat, lon in queries], max(1, repeat // 5))
+    stats["queries"] = len(queries)
+    results["nearest_city_scan"] = stats
+
+    # AQI maths at scale: the scalar helper in a loop versus one vectorized call
+    values = rng.gamma(2.0, 25.0, scale)
+    scalars = values.tolist()
+    stats, _ = measure(lambda: [new.calculate_usaqi(v) for v in scalars], max(1, repeat // 5))
+    stats["values"] = scale
+    results["calculate_usaqi_loop"] = stats
+    stats, _ = measure(lambda: pm25_aqi(values), repeat)
+    stats["values"] = scale
+    results["pm25_aqi_vectorized"] = stats
+
+    results["max_rss_kib"] = max_rss_kib()
+    server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per benchmark")
+    parser.add_argument("--scale", type=int, default=100_000, help="readings for the AQI benchmarks")
+    parser.add_argument("--history-days", type=int, default=30, help="days of readings to seed the store with")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "repeat": args.repeat,
+        "benchmarks": run(args.repeat, args.scale, args.history_days),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
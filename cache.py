@@ -0,0 +1,284 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+import metrics
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("VAYU_CACHE_DIR", os.path.join(BASE_DIR, ".cache"))
+SHARED_CACHE_PATH = os.environ.get("VAYU_SHARED_CACHE", os.path.join(CACHE_DIR, "shared.sqlite3"))
+# Optional: a Redis-compatible server shared by every worker and host
+REDIS_URL = os.environ.get("VAYU_REDIS_URL")
+
+# Size bounds: entries kept in each worker's memory, and total pickled bytes in the shared backend
+LOCAL_SIZE = int(os.environ.get("VAYU_CACHE_LOCAL_SIZE", "256"))
+SHARED_MAX_BYTES = int(os.environ.get("VAYU_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# How long one worker may hold a recompute lock before another takes over
+LOCK_TIMEOUT = 30
+LOCK_POLL = 0.05
+# Access times only order LRU eviction, so an entry's is rewritten at most this often; most
+# shared reads then stay read-only instead of queueing for SQLite's write lock
+ACCESS_RESOLUTION = 60
+
+metrics.REGISTRY.describe("vayu_shared_cache_total", "counter", "Shared cache lookups by result")
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS locks (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+# Shared backend on a local SQLite file: every worker on the host sees the same entries.
+# Entries past their stale window are purged and the least recently used ones are evicted
+# once the total size goes over `max_bytes`.
+class SQLiteBackend:
+    def __init__(self, path=SHARED_CACHE_PATH, max_bytes=SHARED_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread and process, as in store.py
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # (value, fresh_until, stale_until), or None when missing or past its stale window
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, fresh_until, stale_until, accessed FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[2] < now:
+            return None
+        if now - row[3] > ACCESS_RESOLUTION:
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(row[0]), row[1], row[2]
+
+    def set(self, key, value, fresh_until, stale_until):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, fresh_until, stale_until, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, len(payload), fresh_until, stale_until, now),
+            )
+            conn.execute("DELETE FROM entries WHERE stale_until < ?", (now,))
+            total = conn.execute("SELECT coalesce(sum(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop least recently used entries until the rest fit
+                conn.execute(
+                    """
+                    DELETE FROM entries WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, sum(size) OVER (ORDER BY accessed DESC) AS running FROM entries
+                        ) WHERE running > ?
+                    )
+                    """,
+                    (self.max_bytes,),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Take the recompute lock for `key` unless another live owner holds it
+    def acquire(self, key, owner, timeout=LOCK_TIMEOUT):
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO locks (key, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE locks.expires < ?",
+            (key, owner, now + timeout, now),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, key, owner):
+        self._connect().execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
+
+
+# Shared backend on a Redis-compatible server; Redis's own maxmemory policy bounds its size
+class RedisBackend:
+    def __init__(self, url=REDIS_URL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        payload = self.client.get(f"vayu:cache:{key}")
+        return pickle.loads(payload) if payload is not None else None
+
+    def set(self, key, value, fresh_until, stale_until):
+        payload = pickle.dumps((value, fresh_until, stale_until), protocol=pickle.HIGHEST_PROTOCOL)
+        self.client.set(f"vayu:cache:{key}", payload, px=max(1, int((stale_until - time.time()) * 1000)))
+
+    def acquire(self, key, owner, timeout=LOCK_TIMEOUT):
+        return bool(self.client.set(f"vayu:lock:{key}", owner, nx=True, px=int(timeout * 1000)))
+
+    def release(self, key, owner):
+        lock = f"vayu:lock:{key}"
+        if self.client.get(lock) == owner.encode():
+            self.client.delete(lock)
+
+
+# Two-level cache: a small LRU in each worker in front of a backend shared by all of them.
+# get_or_compute() is single-flight: when an entry expires, one worker (and one thread in it)
+# recomputes while the others serve the stale value or, with nothing stale, wait for the result.
+class SharedCache:
+    def __init__(self, backend, local_size=LOCAL_SIZE):
+        self.backend = backend
+        self.local_size = local_size
+        self._token = uuid.uuid4().hex
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        # Held only while some thread works on the key, then dropped
+        self._key_locks = weakref.WeakValueDictionary()
+
+    # Lock owner id; includes the pid so workers forked from a preloaded app stay distinct
+    @property
+    def owner(self):
+        return f"{os.getpid()}-{self._token}"
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                self._local.move_to_end(key)
+            return entry
+
+    def _local_set(self, key, entry):
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _lookup(self, key):
+        entry = self._local_get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry, "local"
+        try:
+            shared = self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading shared cache: {e}")
+            shared = None
+        if shared is not None:
+            self._local_set(key, shared)
+            return shared, "shared"
+        return entry, "miss"
+
+    # Cached value for `key`, computing it with `compute()` when missing or older than `ttl`
+    # seconds. Expired values are still served for `stale` more seconds while another worker
+    # recomputes. Errors from `compute` propagate; nothing is cached for them.
+    def get_or_compute(self, key, compute, ttl, stale=0, name="default"):
+        entry, source = self._lookup(key)
+        now = time.time()
+        if entry is not None and entry[1] > now:
+            metrics.inc("vayu_shared_cache_total", cache=name, result=f"{source}_hit")
+            return entry[0]
+
+        # One thread per worker goes to the backend lock; the rest queue here
+        key_lock = self._key_lock(key)
+        if entry is not None and entry[2] > now:
+            if not key_lock.acquire(blocking=False):
+                metrics.inc("vayu_shared_cache_total", cache=name, result="stale")
+                return entry[0]
+        else:
+            key_lock.acquire()
+        try:
+            deadline = time.time() + LOCK_TIMEOUT
+            while True:
+                entry, source = self._lookup(key)
+                now = time.time()
+                if entry is not None and entry[1] > now:
+                    metrics.inc("vayu_shared_cache_total", cache=name, result=f"{source}_hit")
+                    return entry[0]
+                try:
+                    acquired = self.backend.acquire(key, self.owner)
+                except Exception as e:
+                    print(f"Error locking shared cache: {e}")
+                    acquired = True
+                if acquired or time.time() > deadline:
+                    break
+                if entry is not None and entry[2] > now:
+                    metrics.inc("vayu_shared_cache_total", cache=name, result="stale")
+                    return entry[0]
+                time.sleep(LOCK_POLL)
+
+            metrics.inc("vayu_shared_cache_total", cache=name, result="miss")
+            try:
+                value = compute()
+                now = time.time()
+                entry = (value, now + ttl, now + ttl + stale)
+                self._local_set(key, entry)
+                try:
+                    self.backend.set(key, value, entry[1], entry[2])
+                except Exception as e:
+                    print(f"Error writing shared cache: {e}")
+                return value
+            finally:
+                if acquired:
+                    try:
+                        self.backend.release(key, self.owner)
+                    except Exception as e:
+                        print(f"Error unlocking shared cache: {e}")
+        finally:
+            key_lock.release()
+
+
+def default_backend():
+    if REDIS_URL:
+        try:
+            return RedisBackend(REDIS_URL)
+        except ImportError:
+            print("VAYU_REDIS_URL is set but the redis package is not installed; using SQLite")
+    return SQLiteBackend()
+
+
+_shared = {"cache": None}
+_shared_lock = threading.Lock()
+
+
+# The process-wide cache over the configured backend
+def get_cache():
+    with _shared_lock:
+        if _shared["cache"] is None:
+            _shared["cache"] = SharedCache(default_backend())
+        return _shared["cache"]
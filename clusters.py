@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+
+# Roughly one cluster per 64 px: Leaflet tiles are 256 px wide
+CELLS_PER_TILE = 4
+# From this zoom level on, points are returned individually
+MAX_CLUSTER_ZOOM = 9
+# Hard cap on markers per response, whatever the viewport
+MAX_MARKERS = 500
+
+WORLD_BOUNDS = [[-90, -180], [90, 180]]
+
+
+def cell_size(zoom):
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+# Rows of `points` (with lat/lon columns) inside Leaflet-style bounds [[south, west], [north, east]].
+# Longitudes are shifted into the viewport's frame so panning across the antimeridian works.
+# With a SpatialIndex over `points`, only the matching latitude band is scanned.
+def points_in_bounds(points, bounds, index=None):
+    (south, west), (north, east) = bounds or WORLD_BOUNDS
+    if index is not None:
+        points = points.iloc[index.within_bbox(south, west, north, east)]
+    lat = points["lat"].to_numpy()
+    lon = points["lon"].to_numpy()
+    shifted = west + (lon - west) % 360
+    mask = (lat >= south) & (lat <= north)
+    if east - west < 360:
+        mask &= shifted <= east
+    visible = points[mask].copy()
+    visible["lon"] = shifted[mask]
+    return visible
+
+
+# Grid-cluster the points visible in `bounds` at `zoom`. Returns the number of visible points and
+# one row per cluster with its centroid, size, mean/max of `value` and, for single points, the
+# point's own label. At most MAX_MARKERS rows are returned, so they may cover fewer points.
+def cluster_points(points, bounds, zoom, value="AQI Value", label="City", index=None):
+    visible = points_in_bounds(points, bounds, index)
+    zoom = int(zoom or 0)
+    if zoom >= MAX_CLUSTER_ZOOM or len(visible) <= MAX_MARKERS // 4:
+        singles = visible.nlargest(MAX_MARKERS, value)
+        return len(visible), pd.DataFrame({
+            "lat": singles["lat"].to_numpy(),
+            "lon": singles["lon"].to_numpy(),
+            "count": 1,
+            "mean": singles[value].to_numpy(dtype=float),
+            "max": singles[value].to_numpy(dtype=float),
+            "label": singles[label].astype(str).to_numpy(),
+        })
+
+    size = cell_size(zoom)
+    cells = pd.DataFrame({
+        "gx": np.floor(visible["lon"].to_numpy() / size).astype(np.int64),
+        "gy": np.floor(visible["lat"].to_numpy() / size).astype(np.int64),
+        "lat": visible["lat"].to_numpy(),
+        "lon": visible["lon"].to_numpy(),
+        "value": visible[value].to_numpy(dtype=float),
+        "label": visible[label].astype(str).to_numpy(),
+    })
+    clusters = cells.groupby(["gx", "gy"], sort=False).agg(
+        lat=("lat", "mean"),
+        lon=("lon", "mean"),
+        count=("value", "size"),
+        mean=("value", "mean"),
+        max=("value", "max"),
+        label=("label", "first"),
+    )
+    clusters.loc[clusters["count"] > 1, "label"] = None
+    return len(visible), clusters.nlargest(MAX_MARKERS, "count").reset_index(drop=True)
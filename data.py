@@ -0,0 +1,255 @@
+import hashlib
+import io
+import os
+import pickle
+import threading
+
+import pandas as pd
+import requests
+
+from aqi import CATEGORIES, category_codes
+from spatial import SpatialIndex
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("VAYU_CACHE_DIR", os.path.join(BASE_DIR, ".cache"))
+
+# Bundled dataset, plus an optional newer copy fetched from GitHub into the cache dir
+POLLUTION_CSV = os.path.join(BASE_DIR, "pollution.csv")
+POLLUTION_URL = "https://raw.githubusercontent.com/ShakriyaPanday/vayu/refs/heads/main/pollution.csv"
+REMOTE_POLLUTION_CSV = os.path.join(CACHE_DIR, "pollution-remote.csv")
+# City coordinates resolved offline by geocode_cities.py
+CITY_COORDS_CSV = os.path.join(BASE_DIR, "city_coords.csv")
+
+# Bump when parsing or dtypes change so old caches are ignored
+CACHE_VERSION = 2
+
+# Opt-in: cache the parsed frame as an Arrow IPC file and memory-map it, so every worker
+# reads the same page-cache copy instead of holding its own (needs pyarrow)
+SHARED_ARROW = bool(os.environ.get("VAYU_SHARED_ARROW"))
+
+VALUE_COLUMNS = [
+    "AQI Value", "CO AQI Value", "Ozone AQI Value", "NO2 AQI Value", "PM2.5 AQI Value",
+]
+CATEGORY_COLUMNS = [
+    "AQI Category", "CO AQI Category", "Ozone AQI Category", "NO2 AQI Category", "PM2.5 AQI Category",
+]
+# All category columns share one ordered dtype, so they compare and group on int8 codes
+CATEGORY_DTYPE = pd.CategoricalDtype(CATEGORIES, ordered=True)
+# AQI values top out at 500, so uint16 is plenty; country/city are dictionary-encoded
+POLLUTION_DTYPES = {
+    "Country": "category",
+    "City": "category",
+    **{col: "uint16" for col in VALUE_COLUMNS},
+    **{col: CATEGORY_DTYPE for col in CATEGORY_COLUMNS},
+}
+
+# Per-country statistics precomputed for the choropleth page
+AGGREGATIONS = ["mean", "max", "median", "count"]
+
+_lock = threading.Lock()
+_loaded = {"key": None, "frame": None, "aggregates": None}
+_points = {"key": None, "frame": None, "index": None}
+
+
+# Hash a file in chunks so the cache follows the data, not the mtime
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Parse the CSV with explicit dtypes instead of letting pandas infer object columns
+def read_pollution_csv(path_or_buffer):
+    return pd.read_csv(
+        path_or_buffer,
+        dtype=POLLUTION_DTYPES,
+        usecols=list(POLLUTION_DTYPES),
+        encoding="utf-8-sig",
+    )
+
+
+def _write_atomic(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def _load_pickle(cache_path, path):
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable pollution cache {cache_path}: {e}")
+
+    frame = read_pollution_csv(path)
+    try:
+        _write_atomic(cache_path, pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        print(f"Could not write pollution cache: {e}")
+    return frame
+
+
+def _load_arrow(cache_path, path):
+    import pyarrow as pa
+
+    if not os.path.exists(cache_path):
+        table = pa.Table.from_pandas(read_pollution_csv(path), preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        _write_atomic(cache_path, sink.getvalue())
+    # The mapping stays valid after the file object is closed; numeric blocks are zero-copy
+    with pa.memory_map(cache_path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+# Load a pollution CSV, reusing a parsed cache keyed by the file's hash
+def load_pollution(path=POLLUTION_CSV):
+    digest = file_digest(path)
+    cache_base = os.path.join(CACHE_DIR, f"pollution-{digest[:16]}-v{CACHE_VERSION}")
+    if SHARED_ARROW:
+        try:
+            return _load_arrow(f"{cache_base}.arrow", path)
+        except ImportError:
+            print("VAYU_SHARED_ARROW is set but pyarrow is not installed; using the pickle cache")
+    return _load_pickle(f"{cache_base}.pkl", path)
+
+
+# Pollution rows joined with their geocoded coordinates; cities without coordinates are left out
+def city_points(frame, coords_path=CITY_COORDS_CSV):
+    columns = ["Country", "City", "lat", "lon", *VALUE_COLUMNS, *CATEGORY_COLUMNS]
+    if not os.path.exists(coords_path):
+        return pd.DataFrame(columns=columns)
+    coords = pd.read_csv(
+        coords_path,
+        dtype={"Country": str, "City": str},
+        keep_default_na=False,
+        na_values={"lat": [""], "lon": [""]},
+    ).dropna(subset=["lat", "lon"])
+    rows = frame.assign(Country=frame["Country"].astype(object).fillna(""))
+    return rows.merge(coords, on=["Country", "City"], how="inner")[columns].reset_index(drop=True)
+
+
+# Flag rows whose published categories or overall AQI disagree with the AQI tables.
+# The overall AQI may exceed every listed sub-index (PM10 isn't in the file) but never be below one.
+def audit_pollution(frame):
+    checks = {}
+    for value_col, category_col in zip(VALUE_COLUMNS, CATEGORY_COLUMNS):
+        # Both sides are category codes in the shared CATEGORIES order
+        checks[category_col] = category_codes(frame[value_col]) != frame[category_col].cat.codes.to_numpy()
+    checks["AQI Value"] = (frame["AQI Value"] < frame[VALUE_COLUMNS[1:]].max(axis=1)).to_numpy()
+    return pd.DataFrame(checks, index=frame.index)
+
+
+# Log, per column, how many rows of a freshly loaded dataset fail audit_pollution
+def log_audit(path, frame):
+    flagged = audit_pollution(frame).sum()
+    flagged = flagged[flagged > 0]
+    if len(flagged):
+        counts = ", ".join(f"{column}: {count}" for column, count in flagged.items())
+        print(f"Rows of {os.path.basename(path)} that disagree with the AQI tables ({len(frame)} rows): {counts}")
+
+
+# The refreshed remote copy wins over the bundled file once it exists
+def pollution_source():
+    if os.path.exists(REMOTE_POLLUTION_CSV):
+        return REMOTE_POLLUTION_CSV
+    return POLLUTION_CSV
+
+
+# Collapse the city rows onto one row per country with mean/max/median/count per pollutant
+def country_aggregates(frame):
+    grouped = frame.groupby("Country", observed=True, sort=True)[VALUE_COLUMNS]
+    aggregates = grouped.agg(AGGREGATIONS)
+    aggregates[[(col, "mean") for col in VALUE_COLUMNS]] = (
+        aggregates[[(col, "mean") for col in VALUE_COLUMNS]].round(1)
+    )
+    return aggregates
+
+
+def _refresh_loaded():
+    path = pollution_source()
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if _loaded["key"] != key:
+            frame = load_pollution(path)
+            log_audit(path, frame)
+            _loaded.update(key=key, frame=frame, aggregates=country_aggregates(frame))
+        return _loaded
+
+
+# Current pollution frame for this process, reloaded only when the source file changes
+def get_pollution():
+    return _refresh_loaded()["frame"]
+
+
+# Country-level aggregates matching the frame returned by get_pollution()
+def get_country_aggregates():
+    return _refresh_loaded()["aggregates"]
+
+
+# Geocoded city points for the current dataset, rebuilt when either input file changes
+def get_city_points():
+    loaded = _refresh_loaded()
+    coords_mtime = os.stat(CITY_COORDS_CSV).st_mtime_ns if os.path.exists(CITY_COORDS_CSV) else None
+    key = (loaded["key"], coords_mtime)
+    with _lock:
+        if _points["key"] != key:
+            points = city_points(loaded["frame"])
+            _points.update(key=key, frame=points, index=SpatialIndex(points["lat"], points["lon"]))
+        return _points["frame"]
+
+
+# Spatial index over get_city_points(); positions in the index are row positions in that frame
+def get_city_index():
+    get_city_points()
+    return _points["index"]
+
+
+# Changes whenever the underlying dataset is reloaded; used to key derived caches
+def pollution_version():
+    return _refresh_loaded()["key"]
+
+
+# Download the published CSV and replace the local copy if it parses and differs
+def refresh_from_remote(url=POLLUTION_URL, timeout=(3.05, 30)):
+    try:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"Error refreshing pollution data: {e}")
+        return False
+
+    payload = response.content
+    current = pollution_source()
+    if hashlib.sha256(payload).hexdigest() == file_digest(current):
+        return False
+    try:
+        read_pollution_csv(io.BytesIO(payload))
+    except Exception as e:
+        print(f"Ignoring malformed pollution data from {url}: {e}")
+        return False
+    _write_atomic(REMOTE_POLLUTION_CSV, payload)
+    return True
+
+
+# Optionally keep the dataset in sync with GitHub without blocking startup
+def start_background_refresh(interval=24 * 60 * 60, url=POLLUTION_URL):
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            refresh_from_remote(url)
+            stop.wait(interval)
+
+    thread = threading.Thread(target=run, name="vayu-pollution-refresh", daemon=True)
+    thread.start()
+    return stop
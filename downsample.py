@@ -0,0 +1,35 @@
+import numpy as np
+
+
+# Min/max bucketing: split x into n_out/2 equal-width buckets and keep each bucket's lowest and
+# highest sample, in time order. Spikes survive, which matters for pollution peaks.
+# x must be sorted ascending; returns index positions into x/y.
+def minmax_indices(x, y, n_out):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= n_out or n_out < 4:
+        return np.arange(n)
+    buckets = n_out // 2
+    span = x[-1] - x[0] or 1.0
+    bucket = np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1)
+    # Missing values never win a bucket
+    low = np.where(np.isnan(y), np.inf, y)
+    high = np.where(np.isnan(y), -np.inf, y)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    mins = starts + _segment_argreduce(low, starts, np.minimum)
+    maxs = starts + _segment_argreduce(high, starts, np.maximum)
+    return np.unique(np.concatenate([mins, maxs]))
+
+
+def _segment_argreduce(values, starts, ufunc):
+    # Position within each segment of its min/max; ties go to the first occurrence
+    reduced = ufunc.reduceat(values, starts)
+    lengths = np.diff(np.r_[starts, len(values)])
+    hits = values == np.repeat(reduced, lengths)
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    positions = np.flatnonzero(hits)
+    # Every segment has at least one hit; unique() returns the first one of each
+    _, first = np.unique(segment[positions], return_index=True)
+    return positions[first] - starts
+
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+import store
+
+
+# Berkeley Earth's rule of thumb: 22 µg/m³ of PM2.5 breathed for 24 hours ~ one cigarette
+CIGARETTE_DOSE = 22 * 24
+# Readings further apart than this are treated as an outage, not interpolated across
+MAX_GAP = 30 * 60
+# Trailing windows kept up to date on ingest for the dashboard
+WINDOWS = {"24h": 86400, "7d": 7 * 86400}
+
+# dose in µg/m³·h, hours actually covered by readings, time-weighted mean and cigarettes
+Exposure = namedtuple("Exposure", ["dose", "hours", "mean", "cigarettes"])
+
+
+def make_exposure(dose_seconds, covered_seconds):
+    dose = dose_seconds / 3600
+    mean = dose_seconds / covered_seconds if covered_seconds > 0 else None
+    return Exposure(dose, covered_seconds / 3600, mean, dose / CIGARETTE_DOSE)
+
+
+# Trapezoid segments between consecutive readings as (start times, areas, durations) arrays.
+# `ts` (unix seconds, ascending) and `values` are arrays; gaps longer than `max_gap` and segments
+# touching a missing value count as unmeasured and are left out.
+def segments(ts, values, max_gap=MAX_GAP):
+    ts = np.asarray(ts, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(ts) < 2:
+        return np.empty(0), np.empty(0), np.empty(0)
+    dt = np.diff(ts)
+    areas = 0.5 * (values[1:] + values[:-1]) * dt
+    valid = (dt > 0) & (dt <= max_gap) & ~np.isnan(areas)
+    return ts[:-1][valid], areas[valid], dt[valid]
+
+
+# Trapezoidal integral of PM2.5 over time
+def integrate(ts, values, max_gap=MAX_GAP):
+    _, areas, dt = segments(ts, values, max_gap)
+    return make_exposure(float(areas.sum()), float(dt.sum()))
+
+
+# Exposure for a station between two unix timestamps, from the stored readings. Windows reaching
+# back past the raw retention use the hourly rollups: the busiest hour in the window sets the
+# station's reading rate, and each hour counts as covered in proportion to its readings.
+def exposure(station, start, end):
+    if start >= time.time() - store.RAW_RETENTION_DAYS * 86400:
+        readings = store.raw_series(station, start, end)
+        return integrate(readings["ts"].to_numpy(), readings["pm25"].to_numpy())
+    hours = store.rollup_range(station, "hour", start, end)
+    if hours.empty:
+        return make_exposure(0.0, 0.0)
+    counts = hours["pm25_n"].to_numpy(dtype=float)
+    covered = 3600 * counts / counts.max()
+    return make_exposure(float((hours["pm25"].to_numpy() * covered).sum()), float(covered.sum()))
+
+
+# Running exposure over the trailing `window` seconds, updated one reading at a time: each
+# reading adds one trapezoid segment and segments that slide out of the window are subtracted,
+# so the total never needs a rescan.
+class RollingExposure:
+    def __init__(self, window, max_gap=MAX_GAP):
+        self.window = window
+        self.max_gap = max_gap
+        self.segments = deque()
+        self.dose = 0.0
+        self.covered = 0.0
+        self.last = None
+        self._lock = threading.Lock()
+
+    def add(self, ts, value):
+        with self._lock:
+            if value is None or np.isnan(value):
+                return
+            if self.last is not None:
+                last_ts, last_value = self.last
+                if ts <= last_ts:
+                    return
+                dt = ts - last_ts
+                if dt <= self.max_gap:
+                    area = 0.5 * (value + last_value) * dt
+                    self.segments.append((last_ts, area, dt))
+                    self.dose += area
+                    self.covered += dt
+            self.last = (ts, value)
+            self._evict(ts)
+
+    # Load a stretch of history at once (vectorized), as if each reading had been add()ed
+    def seed(self, ts, values):
+        ts = np.asarray(ts, dtype=float)
+        values = np.asarray(values, dtype=float)
+        measured = ~np.isnan(values)
+        ts, values = ts[measured], values[measured]
+        if not len(ts):
+            return
+        starts, areas, dt = segments(ts, values, self.max_gap)
+        with self._lock:
+            self.segments = deque(zip(starts.tolist(), areas.tolist(), dt.tolist()))
+            self.dose = float(areas.sum())
+            self.covered = float(dt.sum())
+            self.last = (int(ts[-1]), float(values[-1]))
+            self._evict(ts[-1])
+
+    def _evict(self, now):
+        cutoff = now - self.window
+        while self.segments and self.segments[0][0] < cutoff:
+            _, area, dt = self.segments.popleft()
+            self.dose -= area
+            self.covered -= dt
+        if not self.segments:
+            # Subtraction leaves rounding residue; start clean whenever the window empties
+            self.dose = self.covered = 0.0
+
+    def value(self, now=None):
+        with self._lock:
+            self._evict(now if now is not None else time.time())
+            return make_exposure(max(self.dose, 0.0), max(self.covered, 0.0))
+
+
+_rolling = {}
+# One lock per station, so seeding one station's trackers doesn't hold up the others
+_station_locks = {}
+_station_locks_lock = threading.Lock()
+
+
+# This process's rolling tracker for a station and window, seeded from the store on first use
+def rolling(station, window="24h"):
+    key = (station, window)
+    tracker = _rolling.get(key)
+    if tracker is not None:
+        return tracker
+    with _station_locks_lock:
+        station_lock = _station_locks.setdefault(station, threading.Lock())
+    with station_lock:
+        tracker = _rolling.get(key)
+        if tracker is None:
+            tracker = RollingExposure(WINDOWS[window])
+            now = int(time.time())
+            readings = store.raw_series(station, now - WINDOWS[window], now)
+            tracker.seed(readings["ts"].to_numpy(), readings["pm25"].to_numpy())
+            _rolling[key] = tracker
+        return tracker
+
+
+# Fold a fetched reading into every rolling window of its station
+def record(station, data):
+    try:
+        value = float(data.get("pm02"))
+    except (TypeError, ValueError):
+        return
+    ts = store.parse_timestamp(data.get("timestamp"))
+    if ts is None:
+        return
+    for window in WINDOWS:
+        rolling(station, window).add(ts, value)
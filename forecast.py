@@ -0,0 +1,80 @@
+import time
+
+import store
+
+
+# Additive Holt-Winters with a damped trend and a 24-hour season, fed one hourly mean at a time.
+# The whole model is a few numbers per station, so it's updated on ingest instead of refit.
+SEASON = 24
+ALPHA = 0.3   # level
+BETA = 0.02   # trend
+GAMMA = 0.15  # season
+PHI = 0.9     # trend damping, keeps a day-ahead outlook from running away
+HORIZON = 24
+# History used to warm up a station that has no model yet
+WARMUP_DAYS = 14
+
+
+def hour_of_day(bucket):
+    return ((bucket + store.TZ_OFFSET) // 3600) % SEASON
+
+
+def new_state(value):
+    return {"level": value, "trend": 0.0, "season": [0.0] * SEASON, "n": 0}
+
+
+# Fold one hourly mean into the model state (in place)
+def update_state(state, bucket, value):
+    season = state["season"]
+    h = hour_of_day(bucket)
+    previous_level = state["level"]
+    level = ALPHA * (value - season[h]) + (1 - ALPHA) * (previous_level + PHI * state["trend"])
+    state["trend"] = BETA * (level - previous_level) + (1 - BETA) * PHI * state["trend"]
+    season[h] = GAMMA * (value - level) + (1 - GAMMA) * season[h]
+    state["level"] = level
+    state["n"] += 1
+    return state
+
+
+# Hourly PM2.5 forecast for the `horizon` hours after `bucket`, as [[unix hour, value], ...]
+def predict(state, bucket, horizon=HORIZON):
+    forecast = []
+    damping = 0.0
+    for step in range(1, horizon + 1):
+        damping += PHI ** step
+        target = bucket + step * 3600
+        value = state["level"] + damping * state["trend"] + state["season"][hour_of_day(target)]
+        forecast.append([target, round(max(value, 0.0), 1)])
+    return forecast
+
+
+# Fold any newly completed hours into the station's model and store a fresh forecast.
+# Cheap when no hour has completed since the last call, which is most ingests.
+def update_forecast(station):
+    previous_bucket, state, _ = store.load_forecast(station)
+    current_hour = store.bucket_start(int(time.time()), "hour")
+    start = previous_bucket + 3600 if previous_bucket is not None else current_hour - WARMUP_DAYS * 86400
+    if start >= current_hour:
+        return False
+    hours = store.rollup_range(station, "hour", start, current_hour - 1)
+    if hours.empty:
+        return False
+
+    bucket = previous_bucket
+    for bucket, value in zip(hours["bucket"].tolist(), hours["pm25"].tolist()):
+        if state is None:
+            state = new_state(value)
+        update_state(state, bucket, value)
+    return store.save_forecast(station, previous_bucket, bucket, state, predict(state, bucket))
+
+
+# Precomputed forecast for a station from the current hour on: [[unix hour, PM2.5], ...], or []
+# before the first full day. A station that stopped reporting keeps its last forecast, which
+# covers less of the time ahead the longer it stays silent.
+def get_forecast(station, now=None):
+    _, state, forecast = store.load_forecast(station)
+    # A young model hasn't seen a full day of seasonality yet
+    if not state or state["n"] < SEASON:
+        return []
+    current_hour = store.bucket_start(int(now if now is not None else time.time()), "hour")
+    return [point for point in forecast if point[0] >= current_hour]
@@ -0,0 +1,98 @@
+import csv
+import os
+import re
+import sys
+import unicodedata
+from collections import defaultdict
+
+import pandas as pd
+
+
+# Resolve every (Country, City) in pollution.csv to coordinates offline and write city_coords.csv,
+# which is committed with the app. The gazetteer is GeoNames' cities export (CC BY 4.0) as bundled
+# by the geonamescache package, so building needs no network access and no geocoding service:
+#
+#     pip install geonamescache
+#     python geocode_cities.py [min population: 500, 1000, 5000 or 15000]
+#
+# A city matches a GeoNames place in the same country by name, then by alternate name; the most
+# populous match wins. Cities that don't match are written with empty coordinates.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POLLUTION_CSV = os.path.join(BASE_DIR, "pollution.csv")
+CITY_COORDS_CSV = os.path.join(BASE_DIR, "city_coords.csv")
+MIN_POPULATION = 1000
+
+# pollution.csv uses UN country names where GeoNames uses short ones
+COUNTRY_ALIASES = {
+    "United States of America": "US",
+    "Russian Federation": "RU",
+    "United Kingdom of Great Britain and Northern Ireland": "GB",
+    "Netherlands": "NL",
+    "United Republic of Tanzania": "TZ",
+    "Iran (Islamic Republic of)": "IR",
+    "Venezuela (Bolivarian Republic of)": "VE",
+    "Côte d'Ivoire": "CI",
+    "Viet Nam": "VN",
+    "Republic of North Macedonia": "MK",
+    "Bolivia (Plurinational State of)": "BO",
+    "Republic of Moldova": "MD",
+    "Syrian Arab Republic": "SY",
+    "Congo": "CG",
+    "Lao People's Democratic Republic": "LA",
+    "Kingdom of Eswatini": "SZ",
+    "Republic of Korea": "KR",
+    "State of Palestine": "PS",
+}
+
+
+# Case-, accent- and punctuation-insensitive form of a place name
+def normalize(name):
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return re.sub(r"[^\w]+", " ", name.casefold()).strip()
+
+
+# {(country code, normalized name): (lat, lon)}, primary names taking precedence over alternates.
+# Places without a country code in pollution.csv are looked up under None, by primary name only.
+def build_gazetteer(min_population=MIN_POPULATION):
+    import geonamescache
+
+    candidates = defaultdict(list)
+    for city in geonamescache.GeonamesCache(min_city_population=min_population).get_cities().values():
+        place = (city["latitude"], city["longitude"])
+        rank = city["population"] or 0
+        candidates[(city["countrycode"], normalize(city["name"]))].append((1, rank, place))
+        candidates[(None, normalize(city["name"]))].append((1, rank, place))
+        for alternate in city["alternatenames"]:
+            candidates[(city["countrycode"], normalize(alternate))].append((0, rank, place))
+    return {key: max(matches, key=lambda match: match[:2])[2] for key, matches in candidates.items()}
+
+
+def country_codes():
+    import geonamescache
+
+    codes = {country["name"]: code for code, country in geonamescache.GeonamesCache().get_countries().items()}
+    return {**codes, **COUNTRY_ALIASES}
+
+
+def main(min_population=MIN_POPULATION):
+    gazetteer = build_gazetteer(min_population)
+    codes = country_codes()
+    places = pd.read_csv(POLLUTION_CSV, usecols=["Country", "City"], dtype=str, encoding="utf-8-sig")
+    places = places.dropna(subset=["City"]).fillna({"Country": ""}).drop_duplicates().sort_values(["Country", "City"])
+
+    resolved = 0
+    with open(CITY_COORDS_CSV, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["Country", "City", "lat", "lon"])
+        writer.writeheader()
+        for country, city in places.itertuples(index=False):
+            code = codes.get(country) if country else None
+            place = gazetteer.get((code, normalize(city))) if code or not country else None
+            lat, lon = place if place else ("", "")
+            resolved += bool(place)
+            writer.writerow({"Country": country, "City": city, "lat": lat, "lon": lon})
+    print(f"Resolved {resolved} of {len(places)} cities")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else MIN_POPULATION)
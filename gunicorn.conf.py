@@ -0,0 +1,34 @@
+import os
+
+
+# Each open dashboard holds a /stream connection for as long as the tab is open. Under gevent
+# an idle stream is a greenlet parked on the poller rather than a worker thread, so viewers
+# don't use up the capacity that callbacks and /metrics need. `threads` only applies when
+# VAYU_WORKER_CLASS=gthread.
+worker_class = os.environ.get("VAYU_WORKER_CLASS", "gevent")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_connections = int(os.environ.get("VAYU_WORKER_CONNECTIONS", "2000"))
+threads = int(os.environ.get("VAYU_THREADS", "64"))
+
+if worker_class == "gevent":
+    # Patch before preload_app imports the app, so the locks and conditions created at import
+    # time (the poller's change condition, the cache locks) are cooperative in the workers
+    from gevent import monkey
+    monkey.patch_all()
+
+# Import the app once in the master and fork workers from it, so imports, the dataset and the
+# static pages are paid for once and shared copy-on-write. New workers start serving at once.
+preload_app = True
+
+
+def when_ready(server):
+    import new
+    import startup
+    new.warm_up()
+    server.log.info("Startup phases:\n%s", "\n".join(f"  {s * 1000:9.1f} ms  {name}" for name, s in startup.phases()))
+
+
+# Threads don't survive fork: start each worker's poller now rather than on its first request
+def post_fork(server, worker):
+    import new
+    new.live_poller.start()
@@ -0,0 +1,256 @@
+import cProfile
+import functools
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+# Latency buckets in seconds, from a cache hit to a slow upstream call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Response size buckets in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Per-request profiling is only honoured when this directory is configured
+PROFILE_DIR = os.environ.get("VAYU_PROFILE_DIR")
+PROFILE_HEADER = "X-Vayu-Profile"
+
+
+# In-process metric registry rendered in the Prometheus text format. Each gunicorn worker keeps
+# its own numbers; Prometheus tells workers apart by scrape target or sums them.
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = defaultdict(int)
+        self._histograms = {}
+        self._collectors = []
+        self._hooks = []
+
+    def describe(self, name, kind, help_text, buckets=None):
+        self._meta[name] = (kind, help_text, buckets)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    def observe(self, name, value, **labels):
+        buckets = self._meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = [[0] * len(buckets), 0, 0.0]
+            counts, _, _ = entry = self._histograms[key]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    # `collect` is called at scrape time and returns {labels dict as tuple of pairs: value} for `name`
+    def collector(self, name, kind, help_text, collect):
+        self.describe(name, kind, help_text)
+        self._collectors.append((name, collect))
+
+    # `hook()` runs before every render, e.g. to fold in observations made by other processes
+    def on_render(self, hook):
+        self._hooks.append(hook)
+
+    def render(self):
+        for hook in self._hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Error running metrics hook: {e}")
+        samples = defaultdict(list)
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                samples[name].append((labels, value))
+            histograms = [(key, (list(counts), n, total)) for key, (counts, n, total) in self._histograms.items()]
+        for name, collect in self._collectors:
+            try:
+                samples[name].extend(collect().items())
+            except Exception as e:
+                print(f"Error collecting metric {name}: {e}")
+        for (name, labels), (counts, n, total) in histograms:
+            for bound, count in zip(self._meta[name][2], counts):
+                samples[name].append((labels + (("le", _format(bound)),), count, "_bucket"))
+            samples[name].append((labels + (("le", "+Inf"),), n, "_bucket"))
+            samples[name].append((labels, total, "_sum"))
+            samples[name].append((labels, n, "_count"))
+
+        lines = []
+        for name in sorted(samples):
+            kind, help_text, _ = self._meta.get(name, ("untyped", "", None))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value, *suffix in samples[name]:
+                suffix = suffix[0] if suffix else ""
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format(value)}" if label_text
+                             else f"{name}{suffix} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
+REGISTRY.describe("vayu_callback_seconds", "histogram", "Time spent inside Dash callbacks", LATENCY_BUCKETS)
+REGISTRY.describe("vayu_callback_calls_total", "counter", "Dash callback calls by outcome")
+REGISTRY.describe("vayu_upstream_seconds", "histogram", "AirGradient fetch latency, retries included", LATENCY_BUCKETS)
+REGISTRY.describe("vayu_upstream_requests_total", "counter", "AirGradient fetches by outcome")
+REGISTRY.describe("vayu_http_seconds", "histogram", "HTTP request latency, serialization included", LATENCY_BUCKETS)
+REGISTRY.describe("vayu_http_response_bytes", "histogram", "HTTP response body size", SIZE_BUCKETS)
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+collector = REGISTRY.collector
+on_render = REGISTRY.on_render
+render = REGISTRY.render
+
+
+def record_callback(name, seconds, outcome):
+    observe("vayu_callback_seconds", seconds, callback=name)
+    inc("vayu_callback_calls_total", callback=name, outcome=outcome)
+
+
+def _outcome(error):
+    return "prevented" if type(error).__name__ == "PreventUpdate" else "error"
+
+
+# Decorator timing a callback. Goes under @app.callback so Dash registers the timed function.
+# PreventUpdate is control flow, not an error, so it is counted separately.
+def timed_callback(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            outcome = _outcome(e)
+            raise
+        finally:
+            record_callback(name, time.perf_counter() - start, outcome)
+
+    return wrapper
+
+
+# timed_callback for callbacks that run in a short-lived job process (Dash background callbacks),
+# whose own registry dies with it. Timings go onto `queue`, anything with append() and popleft()
+# shared between processes (e.g. a diskcache.Deque), and drain_callbacks(queue) folds them into
+# whichever worker renders next. Prometheus sums the workers, so it doesn't matter which.
+def timed_job(func, queue):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            outcome = _outcome(e)
+            raise
+        finally:
+            queue.append((name, time.perf_counter() - start, outcome))
+
+    return wrapper
+
+
+def drain_callbacks(queue):
+    while True:
+        try:
+            name, seconds, outcome = queue.popleft()
+        except IndexError:
+            return
+        record_callback(name, seconds, outcome)
+
+
+# Hit and miss counters of functools.lru_cache-wrapped functions, keyed by a short cache name
+def watch_lru_caches(caches):
+    def hits():
+        return {(("cache", name),): func.cache_info().hits for name, func in caches.items()}
+
+    def misses():
+        return {(("cache", name),): func.cache_info().misses for name, func in caches.items()}
+
+    collector("vayu_cache_hits_total", "counter", "Cache lookups answered from the cache", hits)
+    collector("vayu_cache_misses_total", "counter", "Cache lookups that had to compute", misses)
+
+
+def url_rule_name(request):
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+# Wire request timing, payload sizes, optional profiling and the /metrics endpoint into a Flask
+# server. `endpoint_name(request)` labels a request; by default it is the matched URL rule, which
+# keeps label cardinality bounded.
+def install(server, endpoint_name=None):
+    from flask import Response, g, request
+
+    @server.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.profiler = None
+        if PROFILE_DIR and request.headers.get(PROFILE_HEADER):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.profiler = profiler
+            except ValueError:
+                # Only one profiler can run at a time; concurrent requests go unprofiled
+                pass
+
+    # Stop this request's profiler, if any, and save its dump; returns the file name
+    def finish_profile():
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return None
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        return os.path.basename(path)
+
+    @server.after_request
+    def record_request(response):
+        profile = finish_profile()
+        if profile is not None:
+            response.headers[PROFILE_HEADER] = profile
+        start = g.pop("metrics_start", None)
+        if start is None or request.path == "/metrics":
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = endpoint_name(request) if endpoint_name else url_rule_name(request)
+        observe("vayu_http_seconds", elapsed, endpoint=endpoint, status=response.status_code)
+        # Streamed responses (the SSE feed) have no length up front
+        if not response.is_streamed and response.content_length is not None:
+            observe("vayu_http_response_bytes", response.content_length, endpoint=endpoint)
+        return response
+
+    # Requests that fail before after_request runs must still release the profiler, or every
+    # later profiled request would find one already running
+    @server.teardown_request
+    def release_profiler(error=None):
+        if g.get("profiler") is not None:
+            try:
+                finish_profile()
+            except OSError as e:
+                print(f"Error saving profile: {e}")
+
+    @server.route("/metrics")
+    def metrics_endpoint():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -1,22 +1,81 @@
+import os
+import importlib
+import json
+import time
+from functools import lru_cache
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash import ctx, dcc, html
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+from flask import Response, jsonify, request, stream_with_context
 import dash_bootstrap_components as dbc
-import requests
 import plotly.graph_objs as go
-from datetime import datetime
 import dash_leaflet as dl
-import plotly.express as px
+import numpy as np
 import pandas as pd
+import startup
+from poller import SnapshotPoller
+from aqi import BREAKPOINTS, CATEGORIES, CATEGORY_HEX, breakpoint_tables, category_codes, multi_pollutant_aqi, pm25_aqi
+import store
+import forecast
+import alerts
+import exposure
+import metrics
+from cache import get_cache
+from airgradient import breaker_states, fetch_location, fetch_locations
+from stations import PRIMARY_STATION, STATIONS, STATIONS_BY_ID, nearest_station, stations_in_bbox
+from data import CACHE_DIR, VALUE_COLUMNS, get_city_index, get_city_points, get_pollution, get_country_aggregates, pollution_version, start_background_refresh
+from clusters import WORLD_BOUNDS, cluster_points
+from query import get_query_index, result_records
+from downsample import minmax_indices
 
 
+# Heavy callbacks run as Dash background callbacks when diskcache is installed: jobs run in
+# their own processes, so request threads stay free for the quick callbacks
+try:
+    import diskcache
+    from dash import DiskcacheManager
+    background_manager = DiskcacheManager(
+        diskcache.Cache(os.path.join(CACHE_DIR, "background")),
+        # Identical requests against the same dataset are answered from the job cache
+        cache_by=[pollution_version],
+        expire=24 * 60 * 60,
+    )
+    # Callback timings from job processes, picked up by the next /metrics scrape of any worker
+    background_timings = diskcache.Deque(directory=os.path.join(CACHE_DIR, "background-metrics"), maxlen=10000)
+    metrics.on_render(lambda: metrics.drain_callbacks(background_timings))
+except ImportError:
+    background_manager = None
+
 # Initialize Dash app
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.COSMO])
-app.title = "VayuDrishti Dashboard"
-server = app.server
+with startup.phase("create Dash app"):
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.COSMO], background_callback_manager=background_manager)
+    app.title = "VayuDrishti Dashboard"
+    server = app.server
+
+# Register a heavy callback. It gets a `set_progress` function first; `progress`, `running` and
+# `cancel` follow Dash's background callback arguments. Without a background manager the
+# callback runs synchronously and `set_progress` is None.
+def heavy_callback(*dependencies, progress=None, running=None, cancel=None):
+    def decorator(func):
+        if background_manager is not None:
+            app.callback(*dependencies, background=True, progress=progress, running=running, cancel=cancel)(
+                metrics.timed_job(func, background_timings))
+            return func
+
+        def synchronous(*args):
+            return func(None, *args)
+
+        synchronous.__name__ = func.__name__
+        app.callback(*dependencies)(metrics.timed_callback(synchronous))
+        return func
+    return decorator
 
-# Load pollution data from CSV
-dmap = pd.read_csv("https://raw.githubusercontent.com/ShakriyaPanday/vayu/refs/heads/main/pollution.csv")
+# The pollution dataset loads on first use (or in warm_up); the parsed frame is cached on disk by file hash.
+# Opt-in: keep pollution.csv in sync with GitHub in the background. Under preload_app this runs
+# in the gunicorn master only; workers notice the rewritten file and reload it.
+if os.environ.get("VAYU_POLLUTION_REFRESH"):
+    start_background_refresh(interval=int(os.environ["VAYU_POLLUTION_REFRESH"]))
 # Footer
 footer = dbc.Container(
     html.Footer(
@@ -82,49 +141,150 @@ footer = dbc.Container(
     )
 )
 
-# API URL
-API_URL = "https://api.airgradient.com/public/api/v1/world/locations/72192/measures/current"
-data = [
-    {"date": "2025-01-16", "pm25": 85.2},
-    {"date": "2025-01-17", "pm25": 78.4},
-    {"date": "2025-01-18", "pm25": 90.1},
-    {"date": "2025-01-19", "pm25": 88.7},
-    {"date": "2025-01-20", "pm25": 92.3},
-    {"date": "2025-01-21", "pm25": 95.5},
-    {"date": "2025-01-22", "pm25": 89.8},
-]
-df = pd.DataFrame(data)
-
-# Function to fetch data from the API
-def fetch_api_data():
-    try:
-        response = requests.get(API_URL)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data: {e}")
-        return None
+POLL_INTERVAL = int(os.environ.get("VAYU_POLL_INTERVAL", "30"))
+# Stations come from stations.json; the first one drives the dashboard cards
+STATION_ID = PRIMARY_STATION["id"]
+
+# One upstream request per station per poll interval across all workers: whichever worker
+# polls first fetches, the rest read its result from the shared cache. Returns
+# (time of the upstream fetch, reading), so a cached or stale reading keeps its real age.
+def fetch_station(location_id, timeout):
+    return get_cache().get_or_compute(
+        f"station:{location_id}",
+        lambda: (time.time(), fetch_location(location_id, timeout)),
+        ttl=max(POLL_INTERVAL - 1, 1), stale=POLL_INTERVAL, name="reading",
+    )
+
+# Fetch every registered station concurrently; stations that fail keep their last reading
+# (stale-while-revalidate), and stations with an open circuit are skipped without a request.
+# Returns the readings and when each was fetched from upstream.
+def fetch_all_stations():
+    results, errors = fetch_locations(STATIONS, fetch=fetch_station)
+    for station_id, error in errors.items():
+        print(f"Error fetching station {station_id}: {error}")
+    readings = {station_id: reading for station_id, (_, reading) in results.items()}
+    updated = {station_id: fetched_at for station_id, (fetched_at, _) in results.items()}
+    return readings, updated
+
+# One shared poller per process; callbacks read its snapshot instead of calling the API
+# Every successful fetch is appended to the on-disk store (duplicates across workers are ignored)
+# and new readings advance that station's forecast model and run the alert rules.
+# Every worker folds each reading into its own rolling exposure windows.
+def record_readings(readings):
+    for station_id, data in readings.items():
+        inserted = store.record(station_id, data)
+        exposure.record(station_id, data)
+        if inserted:
+            forecast.update_forecast(station_id)
+            alerts.evaluate_reading(station_id, data)
+
+live_poller = SnapshotPoller(fetch_all_stations, interval=POLL_INTERVAL, on_data=record_readings, merge=True)
+
+# Map marker for one station's latest reading
+def station_marker(station_id, data):
+    station = STATIONS_BY_ID.get(station_id, {})
+    name = data.get("locationName", station.get("name", station_id))
+    position = [data.get("latitude", station.get("lat")), data.get("longitude", station.get("lon"))]
+    return dl.Marker(
+        position=position,
+        children=[dl.Tooltip(name), dl.Popup(f"PM2.5: {data.get('pm02')} µg/m³, PM10: {data.get('pm10')} µg/m³")]
+    )
+
+# State pushed to browsers: the latest reading per station plus snapshot metadata.
+# `updated` has each station's own fetch time; `unavailable` lists stations whose circuit is open.
+def live_state(snapshot):
+    state = dict(snapshot.data or {})
+    state["_meta"] = {
+        "fetched_at": snapshot.fetched_at,
+        "updated": snapshot.updated,
+        "unavailable": sorted(station_id for station_id, circuit in breaker_states().items() if circuit != "closed"),
+        "ttl": snapshot.ttl,
+        "stale": snapshot.stale,
+        "error": snapshot.error,
+    }
+    return state
+
+# Describe how fresh a station's reading (or, without one, the whole snapshot) is. Pushes only
+# happen when something changed, so this names the fetch time rather than a relative age.
+def format_data_age(meta, station_id=None):
+    if not meta:
+        return ""
+    fetched_at = (meta.get("updated") or {}).get(station_id, meta.get("fetched_at"))
+    if fetched_at is None:
+        return ""
+    age = int(time.time() - fetched_at)
+    text = f"at {pd.Timestamp(fetched_at + store.TZ_OFFSET, unit='s').strftime('%H:%M:%S')}"
+    if station_id in (meta.get("unavailable") or ()):
+        text += " (station unreachable, showing last reading)"
+    elif age > meta.get("ttl", age):
+        text += " (stale)"
+    return text
+
+# Snapshot metadata that moves on every poll; it rides along with a push but never causes one
+VOLATILE_META = ("fetched_at", "updated")
 
-# Calculate US AQI using PM2.5
+def stable_meta(meta):
+    return {key: value for key, value in (meta or {}).items() if key not in VOLATILE_META}
+
+# Server-sent events: each browser holds one connection and gets only the stations whose
+# reading changed since its last event, plus the metadata, and nothing at all while readings
+# and station availability stay the same. Idle connections sleep until the poller refreshes.
+@server.route("/stream")
+def stream_live_updates():
+    def events():
+        sent = {}
+        version = None
+        while True:
+            version = live_poller.wait_for_update(version, timeout=25)
+            state = live_state(live_poller.snapshot())
+            meta = state.pop("_meta")
+            delta = {key: value for key, value in state.items() if sent.get(key) != value}
+            if delta or stable_meta(meta) != stable_meta(sent.get("_meta")):
+                delta["_meta"] = meta
+                sent.update(delta)
+                yield f"data: {json.dumps(delta)}\n\n"
+            else:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Calculate US AQI using PM2.5 (scalar in, float or None out; see aqi.py for arrays)
 def calculate_usaqi(pm25):
-    breakpoints = [
-        {'low': 0, 'high': 12.0, 'aqi_low': 0, 'aqi_high': 50},
-        {'low': 12.1, 'high': 35.4, 'aqi_low': 51, 'aqi_high': 100},
-        {'low': 35.5, 'high': 55.4, 'aqi_low': 101, 'aqi_high': 150},
-        {'low': 55.5, 'high': 150.4, 'aqi_low': 151, 'aqi_high': 200},
-        {'low': 150.5, 'high': 250.4, 'aqi_low': 201, 'aqi_high': 300},
-        {'low': 250.5, 'high': 500.4, 'aqi_low': 301, 'aqi_high': 500},
-    ]
-    for bp in breakpoints:
-        if bp['low'] <= pm25 <= bp['high']:
-            return ((bp['aqi_high'] - bp['aqi_low']) / (bp['high'] - bp['low'])) * (pm25 - bp['low']) + bp['aqi_low']
-    return None  # Out of range
-
-# Calculate cigarette equivalent
-def calculate_cigarette_equivalent(pm25, hours_exposed):
-    if pm25 is not None:
-        return round((pm25 / 22) * (hours_exposed / 24), 2)
-    return "No data"
+    return pm25_aqi(pm25).aqi
+
+# Health advice shown on the dashboard for each AQI category
+HEALTH_ADVICE = {
+    "Good": "Good air quality. No precautions needed.",
+    "Moderate": "Moderate air quality. Sensitive groups should limit outdoor activities.",
+    "Unhealthy for Sensitive Groups": "Unhealthy for sensitive groups. Reduce outdoor exertion.",
+    "Unhealthy": "Unhealthy. Everyone should limit outdoor activities.",
+    "Very Unhealthy": "Very unhealthy. Stay indoors with air filtration.",
+    "Hazardous": "Hazardous. Avoid outdoor activities.",
+}
+
+# Cigarette equivalent of the PM2.5 actually breathed over the last day and week, from the
+# rolling exposure windows rather than one instantaneous reading
+def describe_exposure(station_id):
+    day = exposure.rolling(station_id, "24h").value()
+    if day.hours < 1:
+        return "Not enough readings yet for a cigarette equivalent."
+    week = exposure.rolling(station_id, "7d").value()
+    coverage = f" (from {day.hours:.0f} h of readings)" if day.hours < 23 else ""
+    return (f"Past 24 h: {day.mean:.1f} µg/m³ on average{coverage}, equivalent to smoking "
+            f"{day.cigarettes:.2f} cigarettes. Past 7 days: {week.cigarettes:.1f} cigarettes.")
+
+# Exposure over any stored window, e.g. the range or zoom shown on the history page
+def describe_window_exposure(station_id, start, end):
+    window = exposure.exposure(station_id, start, end)
+    if window.hours < 1:
+        return "Not enough readings in this window for an exposure estimate."
+    return (f"Exposure over {window.hours:.0f} h of readings in this window: {window.dose:.0f} µg/m³·h "
+            f"(mean {window.mean:.1f} µg/m³), about {window.cigarettes:.1f} cigarettes.")
 
 # Navigation Bar
 navbar = dbc.Navbar(
@@ -135,6 +295,9 @@ navbar = dbc.Navbar(
             dbc.NavItem(dbc.NavLink("Learn", href="/learn")),
             dbc.NavItem(dbc.NavLink("About Us", href="/about")),
             dbc.NavItem(dbc.NavLink("Map", href="/map")),
+            dbc.NavItem(dbc.NavLink("City Map", href="/cities")),
+            dbc.NavItem(dbc.NavLink("Explore", href="/explore")),
+            dbc.NavItem(dbc.NavLink("History", href="/history")),
             dbc.NavItem(dbc.NavLink("AQI Calculator", href="/calculator")),
         ], className="ml-auto", navbar=True),
     ]),
@@ -143,11 +306,29 @@ navbar = dbc.Navbar(
     className="mb-4"
 )
 
+# Past 7 days of daily PM2.5 averages from the stored rollups
+def daily_pm25_figure():
+    daily = store.daily_series(STATION_ID, days=7)
+    return {
+        'data': [
+            go.Bar(
+                x=daily['date'],
+                y=daily['pm25'].round(1),
+                name='PM2.5 Daily Averages',
+                marker=dict(color='#007BFF')
+            )
+        ],
+        'layout': go.Layout(
+            title='Past 7 Days PM2.5 Levels',
+            xaxis=dict(title='Date'),
+            yaxis=dict(title='PM2.5 (µg/m³)'),
+            template='plotly_white'
+        )
+    }
+
 # Layout for the Dashboard page
 def dashboard_layout():
     return dbc.Container([
-        dcc.Interval(id='update-interval', interval=30 * 1000, n_intervals=0),  # Update every 30 seconds
-
         html.Div([
             html.H5("LIVE", className='text-center text-danger', style={'font-weight': 'bold'}),
             html.H1("Nepal Air Quality Index (AQI) | Air Pollution", className='text-center my-2', style={'color': '#007BFF'}),
@@ -167,6 +348,14 @@ def dashboard_layout():
             ])
         ], className='mb-4', style={'border-radius': '10px', 'border': '2px solid #007BFF'}),
 
+        # Forecast Card
+        dbc.Card([
+            dbc.CardBody([
+                html.H4("PM2.5 Outlook", className='text-center'),
+                html.Div(id='forecast-outlook', className='text-center mt-2', style={'font-size': '16px'}),
+            ])
+        ], className='mb-4', style={'border-radius': '10px'}),
+
         # Data Cards
         dbc.Row([
             dbc.Col([
@@ -207,10 +396,10 @@ def dashboard_layout():
             ], width=6),
         ], className='mb-4'),
 
-        # Live Graph
+        # Live Graph (daily rollups change slowly, so it's built with the page)
         dbc.Card([
             dbc.CardBody([
-                dcc.Graph(id='live-graph', style={'height': '400px'})
+                dcc.Graph(id='live-graph', figure=daily_pm25_figure(), style={'height': '400px'})
             ])
         ], className='mb-4'),
 
@@ -225,16 +414,19 @@ def dashboard_layout():
                         zoom=30,
                         children=[
                             dl.TileLayer(),  # Default OpenStreetMap layer
-                            dl.Marker(
-                                id='map-marker',
-                                position=[27.7172, 85.3240],  # Default position
-                                children=[dl.Tooltip("Air Quality Station"), dl.Popup("Station Details")]
-                            ),
+                            dl.LayerGroup(id='station-markers'),  # One marker per reporting station
                         ]
                     )
                 ])
             ])
         ]),
+
+        # Station picked by clicking the map (defaults to the primary station)
+        dcc.Store(id='selected-station', data=STATION_ID),
+        # What each section last rendered, so unchanged pushes are skipped
+        dcc.Store(id='rendered-reading'),
+        dcc.Store(id='rendered-markers'),
+        dcc.Store(id='rendered-forecast'),
     ], fluid=True)
 
 # Layout for the About page
@@ -495,56 +687,20 @@ def calculator_layout():
             dbc.Button("Calculate AQI", id='calculate-button', color='primary', className='mt-3'),
             html.Div(id='calculation-output', className='mt-4', style={'font-size': '18px'})
         ], className="text-center"),  # Center the button and output
+        dcc.Store(id='aqi-breakpoints', data=breakpoint_tables()),
     ], fluid=True)
 
 
-# Callback for AQI Calculator
-@app.callback(
+# AQI Calculator runs in the browser (assets/aqi-calculator.js) on the breakpoint tables the
+# page ships in 'aqi-breakpoints'; clicks never reach the server
+app.clientside_callback(
+    ClientsideFunction(namespace='aqi', function_name='calculate'),
     Output('calculation-output', 'children'),
     [Input('calculate-button', 'n_clicks')],
-    [dash.dependencies.State('input-pm25', 'value'),
-     dash.dependencies.State('input-pm10', 'value')]
+    [State('input-pm25', 'value'),
+     State('input-pm10', 'value'),
+     State('aqi-breakpoints', 'data')]
 )
-def calculate_aqi(n_clicks, pm25, pm10):
-    if n_clicks is None or pm25 is None or pm10 is None:
-        return ""
-
-    # Calculate AQI for PM2.5
-    aqi_pm25 = calculate_usaqi(pm25)
-    # Calculate AQI for PM10
-    aqi_pm10 = calculate_usaqi(pm10)
-
-    # Determine the higher AQI value as the final AQI
-    aqi_final = max(aqi_pm25, aqi_pm10) if aqi_pm25 and aqi_pm10 else None
-
-    if aqi_final:
-        # Determine the AQI category
-        if aqi_final <= 50:
-            category = "Good"
-            color = "Green"
-        elif aqi_final <= 100:
-            category = "Moderate"
-            color = "Yellow"
-        elif aqi_final <= 150:
-            category = "Unhealthy for Sensitive Groups"
-            color = "Orange"
-        elif aqi_final <= 200:
-            category = "Unhealthy"
-            color = "Red"
-        elif aqi_final <= 300:
-            category = "Very Unhealthy"
-            color = "Purple"
-        else:
-            category = "Hazardous"
-            color = "Maroon"
-
-        return html.Div([
-            html.P(f"Calculated AQI: {aqi_final:.2f}", style={'font-weight': 'bold', 'font-size': '20px'}),
-            html.P(f"Category: {category}", style={'color': color.lower(), 'font-size': '18px'}),
-            html.P(f"PM2.5 AQI: {aqi_pm25:.2f}, PM10 AQI: {aqi_pm10:.2f}", style={'font-size': '16px'}),
-        ], className="text-center")
-    else:
-        return html.P("Unable to calculate AQI. Please enter valid inputs.", className="text-center")
 
 def choropleth_page_layout():
     return dbc.Container([
@@ -565,63 +721,423 @@ def choropleth_page_layout():
                 clearable=False,
                 className="mb-4"
             ),
+            html.Label("Aggregate Cities by Country:", style={'font-size': '18px'}),
+            dcc.Dropdown(
+                id='aggregation-dropdown',
+                options=[
+                    {"label": "Mean", "value": "mean"},
+                    {"label": "Maximum", "value": "max"},
+                    {"label": "Median", "value": "median"},
+                    {"label": "Number of Cities", "value": "count"}
+                ],
+                value="mean",
+                clearable=False,
+                className="mb-4"
+            ),
         ], style={'width': '50%', 'margin': '0 auto'}),
 
+        # Shown only while the figure is built in the background
+        dbc.Progress(id='choropleth-progress', value=0, max=CHOROPLETH_STEPS, striped=True, animated=True,
+                     style={'display': 'none'}, className='mb-3'),
         dcc.Graph(id='choropleth-map', style={'height': '600px'}),
         
         html.Div("Data Source: NASA", className='text-center mt-4', style={'font-size': '14px', 'color': '#6c757d'}),
     ], fluid=True)
 
-@app.callback(
-    Output('choropleth-map', 'figure'),
-    [Input('pollutant-dropdown', 'value')]
-)
-def update_choropleth_map(selected_pollutant):
+# Choropleth figures are built from the per-country aggregates; `version` keys the cache entry.
+# `progress(step, label)` reports the stages; step CHOROPLETH_STEPS means the figure is ready.
+CHOROPLETH_TTL = 24 * 60 * 60
+CHOROPLETH_STEPS = 3
+
+def build_choropleth_figure(version, selected_pollutant, aggregation, progress=None):
+    # plotly.express is slow to import and only this page needs it
+    import plotly.express as px
+    progress = progress or (lambda step, label: None)
+    progress(1, "Aggregating countries")
+    aggregates = get_country_aggregates()
+    countries = pd.DataFrame({
+        "Country": aggregates.index.astype(str),
+        selected_pollutant: aggregates[(selected_pollutant, aggregation)].to_numpy(),
+        "Cities": aggregates[(selected_pollutant, "count")].to_numpy(),
+    })
     fig = px.choropleth(
-        dmap,
+        countries,
         locations="Country",
         locationmode="country names",
         color=selected_pollutant,
-        hover_name="City",
-        title=f"Heat Map of {selected_pollutant}",
+        hover_name="Country",
+        hover_data={"Cities": True},
+        title=f"Heat Map of {selected_pollutant} ({aggregation} by country)",
         color_continuous_scale="Viridis"
     )
+    progress(2, "Drawing map")
     fig.update_layout(
         geo=dict(showframe=False, showcoastlines=True, projection_type='equirectangular'),
         margin={"r": 0, "t": 30, "l": 0, "b": 0},
     )
-    return fig
+    return fig.to_dict()
+
+@heavy_callback(
+    Output('choropleth-map', 'figure'),
+    [Input('pollutant-dropdown', 'value'),
+     Input('aggregation-dropdown', 'value')],
+    progress=[Output('choropleth-progress', 'value'), Output('choropleth-progress', 'label')],
+    running=[(Output('choropleth-progress', 'style'), {'display': 'flex'}, {'display': 'none'})],
+    cancel=[Input('url', 'pathname')],
+)
+def update_choropleth_map(set_progress, selected_pollutant, aggregation):
+    version, aggregation = pollution_version(), aggregation or "mean"
+
+    def progress(step, label):
+        if set_progress is not None:
+            set_progress((step, label))
+
+    progress(0, "Loading")
+    # Shared by every worker: only one of them builds a given figure
+    figure = get_cache().get_or_compute(
+        f"choropleth:{version}:{selected_pollutant}:{aggregation}",
+        lambda: build_choropleth_figure(version, selected_pollutant, aggregation, progress),
+        ttl=CHOROPLETH_TTL, stale=CHOROPLETH_TTL, name="choropleth",
+    )
+    progress(CHOROPLETH_STEPS, "Done")
+    return figure
+
+# Layout for the city-level map; markers are loaded for the visible area only
+def city_map_layout():
+    return dbc.Container([
+        html.H1("Air Quality by City", className='text-center my-4', style={'color': '#007BFF'}),
+        html.P("Zoom in to break clusters into individual cities.", className='text-center', style={'font-size': '16px'}),
+        dl.Map(
+            id='city-map',
+            style={'width': '100%', 'height': '600px'},
+            center=[20, 0],
+            zoom=2,
+            children=[
+                dl.TileLayer(),
+                dl.LayerGroup(id='city-markers'),
+            ]
+        ),
+        html.Div(id='city-map-status', className='text-center mt-2', style={'font-size': '14px', 'color': '#6c757d'}),
+        html.Div("City locations: GeoNames (CC BY 4.0)", className='text-center mt-2', style={'font-size': '14px', 'color': '#6c757d'}),
+    ], fluid=True)
+
+# Circle marker for one city or one cluster of cities, colored by AQI category
+def city_marker(row):
+    color = CATEGORY_HEX[max(int(category_codes(row["mean"])), 0)]
+    if row["count"] == 1:
+        tooltip = f"{row['label']}: AQI {row['mean']:.0f}"
+        radius = 6
+    else:
+        tooltip = f"{row['count']} cities, mean AQI {row['mean']:.0f}, worst {row['max']:.0f}"
+        radius = 6 + 3 * np.log2(row["count"])
+    return dl.CircleMarker(
+        center=[row["lat"], row["lon"]],
+        radius=radius,
+        color=color,
+        fillColor=color,
+        fillOpacity=0.7,
+        weight=1,
+        children=[dl.Tooltip(tooltip)]
+    )
+
+@app.callback(
+    [Output('city-markers', 'children'),
+     Output('city-map-status', 'children')],
+    [Input('city-map', 'bounds'),
+     Input('city-map', 'zoom')]
+)
+@metrics.timed_callback
+def update_city_markers(bounds, zoom):
+    points = get_city_points()
+    if points.empty:
+        return [], "City coordinates are not available; run geocode_cities.py to build city_coords.csv."
+    total, clusters = cluster_points(points, bounds, zoom, index=get_city_index())
+    shown = int(clusters["count"].sum())
+    status = f"Showing {shown} cities in {len(clusters)} markers"
+    if shown < total:
+        status += f" ({total} cities in view; zoom in to see the rest)"
+    return [city_marker(row) for row in clusters.to_dict("records")], status
+
+# City query API, e.g. /api/cities?country=India&column=PM2.5%20AQI%20Value&min=150&limit=20
+# or /api/cities?per_country=20 for the 20 worst cities of every country
+@server.route("/api/cities")
+def api_cities():
+    try:
+        total, result = get_query_index().query(
+            country=request.args.getlist("country"),
+            category=request.args.getlist("category"),
+            column=request.args.get("column", "AQI Value"),
+            min_value=request.args.get("min"),
+            max_value=request.args.get("max"),
+            limit=request.args.get("limit", 100),
+            per_country=request.args.get("per_country"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"total": total, "rows": result_records(result)})
+
+# Layout for the city explorer; the controls map one-to-one onto /api/cities parameters
+def explore_layout():
+    return dbc.Container([
+        html.H1("Explore Cities", className='text-center my-4', style={'color': '#007BFF'}),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label("Country"),
+                dcc.Dropdown(
+                    id='explore-country',
+                    options=[{"label": c, "value": c} for c in get_query_index().countries()],
+                    multi=True,
+                    placeholder="All countries"
+                ),
+            ], md=4),
+            dbc.Col([
+                dbc.Label("Pollutant"),
+                dcc.Dropdown(
+                    id='explore-column',
+                    options=[{"label": col, "value": col} for col in VALUE_COLUMNS],
+                    value="AQI Value",
+                    clearable=False
+                ),
+            ], md=4),
+            dbc.Col([
+                dbc.Label("Category"),
+                dcc.Dropdown(
+                    id='explore-category',
+                    options=[{"label": c, "value": c} for c in CATEGORIES],
+                    multi=True,
+                    placeholder="Any category"
+                ),
+            ], md=4),
+        ], className='mb-3'),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label("AQI Range"),
+                dcc.RangeSlider(id='explore-range', min=0, max=500, step=1, value=[0, 500],
+                                marks={v: str(v) for v in (0, 50, 100, 150, 200, 300, 500)}),
+            ], md=6),
+            dbc.Col([
+                dbc.Label("Show"),
+                dcc.Input(id='explore-limit', type='number', min=1, max=1000, value=50, className="form-control"),
+            ], md=3),
+            dbc.Col([
+                dbc.Label("Worst per Country"),
+                dcc.Input(id='explore-per-country', type='number', min=1, placeholder="All", className="form-control"),
+            ], md=3),
+        ], className='mb-3'),
+        html.Div(id='explore-summary', className='text-center mb-2', style={'font-size': '16px'}),
+        html.Div(id='explore-results'),
+    ], fluid=True)
+
+@app.callback(
+    [Output('explore-results', 'children'),
+     Output('explore-summary', 'children')],
+    [Input('explore-country', 'value'),
+     Input('explore-column', 'value'),
+     Input('explore-category', 'value'),
+     Input('explore-range', 'value'),
+     Input('explore-limit', 'value'),
+     Input('explore-per-country', 'value')]
+)
+@metrics.timed_callback
+def update_explore_results(countries, column, categories, value_range, limit, per_country):
+    min_value, max_value = value_range or (None, None)
+    try:
+        total, result = get_query_index().query(
+            country=countries, category=categories, column=column,
+            min_value=min_value, max_value=max_value, limit=limit, per_country=per_country,
+        )
+    except ValueError as e:
+        return None, str(e)
+    category_column = column.replace("Value", "Category")
+    table = dbc.Table.from_dataframe(
+        result[["Country", "City", column, category_column]].astype(str),
+        striped=True, bordered=True, hover=True, responsive=True, size='sm'
+    )
+    return table, f"Showing {len(result)} of {total} matching cities"
+
+# Time ranges offered on the history page, in seconds
+HISTORY_RANGES = {"24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400, "90d": 90 * 86400}
+# Bounds on points per chart, whatever the reported screen width
+HISTORY_MIN_POINTS = 200
+HISTORY_MAX_POINTS = 4000
+
+# Layout for the history page
+def history_layout():
+    return dbc.Container([
+        html.H1("PM2.5 History", className='text-center my-4', style={'color': '#007BFF'}),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label("Station"),
+                dcc.Dropdown(
+                    id='history-station',
+                    options=[{"label": station["name"], "value": station["id"]} for station in STATIONS],
+                    value=STATION_ID,
+                    clearable=False
+                ),
+            ], md=6),
+            dbc.Col([
+                dbc.Label("Range"),
+                dbc.RadioItems(
+                    id='history-range',
+                    options=[{"label": key, "value": key} for key in HISTORY_RANGES],
+                    value="7d",
+                    inline=True
+                ),
+            ], md=6),
+        ], className='mb-3'),
+        dcc.Graph(id='history-graph', style={'height': '500px'}),
+        html.Div(id='history-info', className='text-center mt-2', style={'font-size': '14px', 'color': '#6c757d'}),
+        dcc.Store(id='history-width'),
+    ], fluid=True)
+
+# Report the browser width once so the server can size the downsampling
+app.clientside_callback(
+    "function(_) { return window.innerWidth; }",
+    Output('history-width', 'data'),
+    Input('history-graph', 'id')
+)
+
+# Unix window [start, end] from a zoom event, or None if the event isn't a zoom
+def zoom_window(relayout):
+    if "xaxis.range[0]" in relayout:
+        bounds = relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+    elif "xaxis.range" in relayout:
+        bounds = relayout["xaxis.range"]
+    else:
+        return None
+    # Chart times are local wall-clock times; undo the offset to get unix seconds
+    return [int(pd.Timestamp(bound).timestamp()) - store.TZ_OFFSET for bound in bounds]
+
+# Series for [start, end] with at most ~max_points points. Wide windows read the hourly
+# rollups (mean with a min/max band); narrow ones read raw samples. Either way the result is
+# min/max-bucketed so peaks survive.
+def history_series(station_id, start, end, max_points):
+    if (end - start) / max_points >= 3600:
+        frame = store.rollup_range(station_id, "hour", start, end)
+        source = "hourly averages"
+    else:
+        frame = store.raw_series(station_id, start, end)
+        frame["time"] = pd.to_datetime(frame["ts"] + store.TZ_OFFSET, unit="s")
+        source = "raw readings"
+    total = len(frame)
+    if total:
+        frame = frame.iloc[minmax_indices(frame["time"].astype("int64"), frame["pm25"], max_points)]
+    return frame, source, total
+
+@app.callback(
+    [Output('history-graph', 'figure'),
+     Output('history-info', 'children')],
+    [Input('history-station', 'value'),
+     Input('history-range', 'value'),
+     Input('history-graph', 'relayoutData'),
+     Input('history-width', 'data')]
+)
+@metrics.timed_callback
+def update_history(station_id, range_key, relayout, width):
+    end = int(time.time())
+    start = end - HISTORY_RANGES.get(range_key, HISTORY_RANGES["7d"])
+    if ctx.triggered_id == 'history-graph':
+        window = zoom_window(relayout or {})
+        if window is None and not (relayout or {}).get("xaxis.autorange"):
+            raise PreventUpdate
+        if window is not None:
+            # Zoomed in: re-query just that window at full resolution
+            start, end = max(window[0], start), min(window[1], end)
+
+    max_points = max(HISTORY_MIN_POINTS, min(int(width or 1200), HISTORY_MAX_POINTS))
+    frame, source, total = history_series(station_id, start, end, max_points)
+
+    traces = []
+    if "pm25_min" in frame:
+        traces += [
+            go.Scatter(x=frame["time"], y=frame["pm25_max"], mode='lines', line=dict(width=0),
+                       showlegend=False, hoverinfo='skip'),
+            go.Scatter(x=frame["time"], y=frame["pm25_min"], mode='lines', line=dict(width=0),
+                       fill='tonexty', fillcolor='rgba(0, 123, 255, 0.15)', name='Hourly range'),
+        ]
+    traces.append(go.Scatter(x=frame["time"], y=frame["pm25"].round(1), mode='lines', name='PM2.5',
+                             line=dict(color='#007BFF')))
+    figure = {
+        'data': traces,
+        'layout': go.Layout(
+            xaxis=dict(title='Time'),
+            yaxis=dict(title='PM2.5 (µg/m³)'),
+            template='plotly_white',
+            # Keeps the user's zoom when the zoomed-in data comes back
+            uirevision=f"{station_id}-{range_key}",
+            margin={"r": 10, "t": 30, "l": 50, "b": 40},
+        )
+    }
+    return figure, f"Showing {len(frame)} of {total} {source}. {describe_window_exposure(station_id, start, end)}"
 
 # App Layout
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
+    # Filled by assets/live-stream.js from the /stream server-sent events
+    dcc.Store(id='live-store'),
     navbar,
     html.Div(id='page-content'),
     footer 
 ])
 
+# Pages whose content never changes between requests
+STATIC_PAGES = {
+    '/about': about_layout,
+    '/calculator': calculator_layout,
+    '/learn': learn_page_layout,
+    '/map': choropleth_page_layout,
+    '/cities': city_map_layout,
+    '/explore': explore_layout,
+    '/history': history_layout,
+}
+
+def not_found_layout():
+    return dbc.Container(
+        html.H1("404: Page Not Found", className='text-center text-danger'),
+        fluid=True
+    )
+
+# Static pages are built once per process and dataset version (the explorer's options come from
+# the dataset), so navigation reuses the component tree instead of rebuilding it. Dash still
+# serializes the tree for each response.
+@lru_cache(maxsize=4 * (len(STATIC_PAGES) + 1))
+def static_page(pathname, version):
+    return STATIC_PAGES.get(pathname, not_found_layout)()
+
+# Pay the first-request costs up front: the dataset and its derived indexes, plotly.express and
+# the static pages. gunicorn.conf.py runs this in the master so forked workers share
+# the result; without it each piece loads lazily on first use.
+def warm_up():
+    with startup.phase("load pollution dataset"):
+        get_pollution()
+        get_country_aggregates()
+    with startup.phase("build query and city indexes"):
+        get_query_index()
+        get_city_index()
+    with startup.phase("import plotly.express"):
+        importlib.import_module("plotly.express")
+    with startup.phase("build static pages"):
+        for pathname in STATIC_PAGES:
+            static_page(pathname, pollution_version())
+
 # Callbacks
 @app.callback(
     Output('page-content', 'children'),
     [Input('url', 'pathname')]
 )
+@metrics.timed_callback
 def display_page(pathname):
-    if pathname == '/about':
-        return about_layout()
-    elif pathname == '/calculator':
-        return calculator_layout()
-    elif pathname == '/learn':
-        return learn_page_layout()
-    elif pathname == '/map':  
-        return choropleth_page_layout()
-    elif pathname == '/':
+    if pathname == '/':
         return dashboard_layout()
-    else:
-        return dbc.Container(
-            html.H1("404: Page Not Found", className='text-center text-danger'),
-            fluid=True
-        )
+    # Unknown paths share one cached 404 page
+    return static_page(pathname if pathname in STATIC_PAGES else None, pollution_version())
+
+# Latest readings for the dashboard: the pushed state, or this worker's own snapshot
+# until the first pushed event arrives
+def current_readings(live_data):
+    return live_data or live_state(live_poller.snapshot())
 
+# Cards only change when the primary station reports a new measurement
 @app.callback(
     [Output('location-name', 'children'),
      Output('pm02-value', 'children'),
@@ -631,82 +1147,43 @@ def display_page(pathname):
      Output('aqi-value', 'children'),
      Output('health-advice', 'children'),
      Output('cigarette-equivalent', 'children'),
-     Output('live-graph', 'figure'),  # Added Output for live-graph
-     Output('map', 'children'),       # Map children
-     Output('last-updated', 'children')],
-    [Input('update-interval', 'n_intervals')]
+     Output('rendered-reading', 'data')],
+    [Input('live-store', 'data'),
+     Input('selected-station', 'data')],
+    [State('rendered-reading', 'data')]
 )
-def update_dashboard(n_intervals):
-    data = fetch_api_data()
+@metrics.timed_callback
+def update_dashboard(live_data, station_id, rendered_reading):
+    station_id = station_id or STATION_ID
+    data = current_readings(live_data).get(station_id)
+    reading_key = f"{station_id}@{data.get('timestamp', '')}" if data else f"{station_id}@No data"
+    if reading_key == rendered_reading:
+        raise PreventUpdate
     if not data:
-        return "No data", "No data", "No data", "No data", "No data", "No data", "No data", "No data", {}, {}, "Last Updated: No data"
+        return "No data", "No data", "No data", "No data", "No data", "No data", "No data", "No data", reading_key
 
-    location_name = data.get("locationName", "Samakushi, Kathmandu")
+    station = STATIONS_BY_ID.get(station_id, PRIMARY_STATION)
+    location_name = data.get("locationName", station["name"])
+    city = nearest_city_name(data.get("latitude", station["lat"]), data.get("longitude", station["lon"]))
+    if city:
+        location_name = f"{location_name} (near {city})"
     pm25 = data.get("pm02", 80.99)
     pm10 = data.get("pm10", 120.06)
     temperature = data.get("atmp", "22")
     humidity = data.get("rhum", "62")
-    lat = data.get("latitude", 27.732825)
-    lon = data.get("longitude", 85.342826)
-    timestamp = data.get("timestamp", "9:34:24")
-    
 
     # Calculate AQI
-    us_aqi = calculate_usaqi(pm25)
+    aqi_result = multi_pollutant_aqi({"pm25": pm25, "pm10": pm10})
+    us_aqi = aqi_result.aqi
 
     # Determine health advice and cigarette equivalent
     if us_aqi is not None:
-        if us_aqi <= 50:
-            health_advice = "Good air quality. No precautions needed."
-        elif us_aqi <= 100:
-            health_advice = "Moderate air quality. Sensitive groups should limit outdoor activities."
-        elif us_aqi <= 150:
-            health_advice = "Unhealthy for sensitive groups. Reduce outdoor exertion."
-        elif us_aqi <= 200:
-            health_advice = "Unhealthy. Everyone should limit outdoor activities."
-        elif us_aqi <= 300:
-            health_advice = "Very unhealthy. Stay indoors with air filtration."
-        else:
-            health_advice = "Hazardous. Avoid outdoor activities."
-        cigarette_equivalent = f"Equivalent to smoking {calculate_cigarette_equivalent(pm25, 24)} cigarettes per day."
+        health_advice = f"{HEALTH_ADVICE[aqi_result.category]} Main pollutant: {BREAKPOINTS[aqi_result.dominant]['label']}."
+        cigarette_equivalent = describe_exposure(station_id)
     else:
         health_advice = "No data available for health advice."
         cigarette_equivalent = "No data available for cigarette equivalent."
 
-    # Format timestamp
-    if timestamp != "No data":
-        last_updated = f"Last Updated: {datetime.fromisoformat(timestamp.replace('Z', '')).strftime('%Y-%m-%d %H:%M:%S')}"
-    else:
-        last_updated = "Last Updated: No data"
-
-    # Create live graph
-    bar_graph_figure = {
-    'data': [
-        go.Bar(
-            x=df['date'], 
-            y=df['pm25'], 
-            name='PM2.5 Daily Averages', 
-            marker=dict(color='#007BFF')
-        )
-    ],
-    'layout': go.Layout(
-        title='Past 7 Days PM2.5 Levels',
-        xaxis=dict(title='Date'),
-        yaxis=dict(title='PM2.5 (µg/m³)'),
-        template='plotly_white'
-    )
-}
-
-
-    # Create the map with updated marker position
-    map_children = [
-        dl.TileLayer(),
-        dl.Marker(
-            position=[lat, lon],
-            children=[dl.Tooltip(location_name), dl.Popup(f"PM2.5: {pm25} µg/m³, PM10: {pm10} µg/m³")]
-        )
-    ]
-
     return (
     location_name,
     f"{pm25} µg/m³",
@@ -716,9 +1193,127 @@ def update_dashboard(n_intervals):
     f"{us_aqi:.2f}" if us_aqi else "No data",
     health_advice,
     cigarette_equivalent,
-    bar_graph_figure,   # For 'live-graph'
-    map_children,        # For 'map'
-    last_updated         # For 'last-updated'
+    reading_key
+)
+
+# Summary of one forecast window, e.g. "Next 6 h: 40–75 µg/m³, peaking around 21:00 (Unhealthy)"
+def describe_outlook(points, hours):
+    window = points[:hours]
+    if len(window) < hours:
+        return f"Next {hours} h: outlook unavailable, the station hasn't reported recently"
+    low = min(value for _, value in window)
+    peak_time, peak = max(window, key=lambda point: point[1])
+    peak_clock = pd.Timestamp(peak_time + store.TZ_OFFSET, unit='s').strftime('%H:%M')
+    category = pm25_aqi(peak).category
+    return f"Next {hours} h: {low:.0f}–{peak:.0f} µg/m³, peaking around {peak_clock} ({category})"
+
+# The forecast is computed on ingest; this only reads it, and only re-renders when it changed
+@app.callback(
+    [Output('forecast-outlook', 'children'),
+     Output('rendered-forecast', 'data')],
+    [Input('live-store', 'data'),
+     Input('selected-station', 'data')],
+    [State('rendered-forecast', 'data')]
+)
+@metrics.timed_callback
+def update_forecast_outlook(live_data, station_id, rendered_forecast):
+    station_id = station_id or STATION_ID
+    points = forecast.get_forecast(station_id)
+    forecast_key = f"{station_id}@{points[0][0] if points else None}"
+    if forecast_key == rendered_forecast:
+        raise PreventUpdate
+    if not points:
+        return "No forecast: not enough recent history for this station.", forecast_key
+    return html.Div([html.P(describe_outlook(points, hours), className='mb-1') for hours in (6, 24)]), forecast_key
+
+# Clicking the dashboard map switches the cards to the sensor closest to the click
+@app.callback(
+    Output('selected-station', 'data'),
+    [Input('map', 'clickData')]
+)
+@metrics.timed_callback
+def select_nearest_station(click_data):
+    if not click_data or "latlng" not in click_data:
+        raise PreventUpdate
+    station, _ = nearest_station(click_data["latlng"]["lat"], click_data["latlng"]["lng"])
+    return station["id"]
+
+# Beyond this distance a city is no landmark for the sensor, so none is named
+NEAR_CITY_KM = 50
+
+# Closest pollution.csv city to a point, if city coordinates are available and it is near enough
+def nearest_city_name(lat, lon, max_km=NEAR_CITY_KM):
+    points = get_city_points()
+    if points.empty or lat is None or lon is None:
+        return None
+    (position,), (distance,) = get_city_index().nearest(float(lat), float(lon), k=1)
+    return points["City"].iat[position] if distance <= max_km else None
+
+# The timestamp line is tiny and also reflects snapshot age, so it updates on every push
+@app.callback(
+    Output('last-updated', 'children'),
+    [Input('live-store', 'data'),
+     Input('selected-station', 'data')]
+)
+@metrics.timed_callback
+def update_last_updated(live_data, station_id):
+    readings = current_readings(live_data)
+    data = readings.get(station_id or STATION_ID)
+    timestamp = store.parse_timestamp(data.get("timestamp")) if data else None
+
+    # Upstream times are UTC; show them in local time, like the fetch time after them
+    if timestamp is not None:
+        last_updated = f"Last Updated: {pd.Timestamp(timestamp + store.TZ_OFFSET, unit='s').strftime('%Y-%m-%d %H:%M:%S')}"
+    else:
+        last_updated = "Last Updated: No data"
+    data_age = format_data_age(readings.get("_meta"), station_id or STATION_ID)
+    if data_age:
+        last_updated += f" · fetched {data_age}"
+    return last_updated
+
+# Only the marker layer is replaced, and only when the set of stations in view or one of their
+# measurements changed; the tile layer stays mounted so the map doesn't flicker
+@app.callback(
+    [Output('station-markers', 'children'),
+     Output('rendered-markers', 'data')],
+    [Input('live-store', 'data'),
+     Input('map', 'bounds')],
+    [State('rendered-markers', 'data')]
+)
+@metrics.timed_callback
+def update_station_markers(live_data, bounds, rendered_markers):
+    readings = current_readings(live_data)
+    (south, west), (north, east) = bounds or WORLD_BOUNDS
+    in_view = {station["id"] for station in stations_in_bbox(south, west, north, east)}
+    reported = [station["id"] for station in STATIONS if station["id"] in in_view and readings.get(station["id"])]
+    markers_key = [[station_id, readings[station_id].get("timestamp")] for station_id in reported]
+    if markers_key == rendered_markers:
+        raise PreventUpdate
+    return [station_marker(station_id, readings[station_id]) for station_id in reported], markers_key
+
+# Metrics at /metrics. Dash callback requests are labelled by the callback they ran; send the
+# X-Vayu-Profile header (with VAYU_PROFILE_DIR set) to save a cProfile dump of one request.
+def metrics_endpoint_name(req):
+    if req.path.endswith("/_dash-update-component"):
+        output = (req.get_json(silent=True) or {}).get("output")
+        callback = app.callback_map.get(output, {}).get("callback")
+        return f"callback:{getattr(callback, '__name__', 'unknown')}"
+    return metrics.url_rule_name(req)
+
+metrics.install(server, metrics_endpoint_name)
+metrics.watch_lru_caches({"static_page": static_page})
+metrics.collector(
+    "vayu_startup_seconds", "gauge", "Time spent in each startup phase of this process",
+    lambda: {(("phase", name),): seconds for name, seconds in startup.phases()},
+)
+metrics.collector(
+    "vayu_live_data_age_seconds", "gauge", "Seconds since each station's reading was last fetched",
+    lambda: {(("station", station_id),): time.time() - fetched_at
+             for station_id, fetched_at in live_poller.snapshot(wait=False).updated.items()},
+)
+metrics.collector(
+    "vayu_circuit_open", "gauge", "1 while a station's circuit breaker is not closed",
+    lambda: {(("station", station_id),): int(circuit != "closed") for station_id, circuit in breaker_states().items()},
 )
 
 
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+
+# What callbacks get back from a poller: the last good payload plus its freshness.
+# `updated` maps each key of a merged payload to when that key was last fetched.
+Snapshot = namedtuple("Snapshot", ["data", "fetched_at", "age", "ttl", "stale", "error", "version", "updated"])
+
+
+# Background poller that refreshes one upstream payload on a fixed cadence and
+# serves every callback in the process from the same in-memory snapshot.
+# `on_data` is called with each successfully fetched payload (e.g. to persist it).
+# With `merge`, dict payloads are merged key by key so a partial fetch keeps older entries.
+# `fetch` may also return (payload, {key: fetch time}) when entries can be older than the
+# refresh itself, e.g. when they come from a cache; otherwise every key counts as fetched now.
+class SnapshotPoller:
+    def __init__(self, fetch, interval=30, ttl=None, first_wait=10, on_data=None, merge=False):
+        self.fetch = fetch
+        self.on_data = on_data
+        self.merge = merge
+        self.interval = interval
+        self.ttl = ttl if ttl is not None else 2 * interval
+        self.first_wait = first_wait
+        self._lock = threading.Lock()
+        # Signalled after every refresh so push subscribers can sleep until something happens
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._data = None
+        self._fetched_at = None
+        self._updated = {}
+        self._error = None
+
+    def start(self):
+        # Threads don't survive a fork, so a preloaded app restarts the poller in each worker
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return self
+            self._pid = os.getpid()
+            self._ready = threading.Event()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="vayu-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        stop = self._stop
+        while not stop.is_set():
+            self.refresh()
+            stop.wait(self.interval)
+
+    def refresh(self):
+        updated = None
+        try:
+            data = self.fetch()
+            if isinstance(data, tuple):
+                data, updated = data
+            error = None if data else "No data returned"
+        except Exception as e:
+            data, error = None, str(e)
+            print(f"Error polling data: {e}")
+        with self._lock:
+            # A failed refresh keeps serving the last good payload
+            if data:
+                self._data = {**self._data, **data} if self.merge and self._data else data
+                self._fetched_at = time.time()
+                if self.merge:
+                    stamps = dict.fromkeys(data, self._fetched_at)
+                    stamps.update((key, at) for key, at in (updated or {}).items() if key in stamps)
+                    self._updated = {**self._updated, **stamps}
+            self._error = error
+            self._version += 1
+            self._changed.notify_all()
+        self._ready.set()
+        if data and self.on_data is not None:
+            try:
+                self.on_data(data)
+            except Exception as e:
+                print(f"Error handling polled data: {e}")
+        return data
+
+    # Without `wait`, the current state is returned as is: the poller isn't started and a cold
+    # process doesn't block on its first fetch (for readers such as metrics scrapes)
+    def snapshot(self, wait=True):
+        if wait:
+            self.start()
+            # Only the very first request of a process waits for the initial fetch
+            self._ready.wait(self.first_wait)
+        with self._lock:
+            data, fetched_at, error, version = self._data, self._fetched_at, self._error, self._version
+            updated = self._updated
+        age = time.time() - fetched_at if fetched_at is not None else None
+        stale = age is None or age > self.ttl
+        return Snapshot(data, fetched_at, age, self.ttl, stale, error, version, updated)
+
+    # Block until a refresh newer than `version` has happened (or `timeout` passes);
+    # returns the current version. Waiting costs no CPU.
+    def wait_for_update(self, version, timeout=None):
+        self.start()
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
@@ -0,0 +1,149 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from aqi import CATEGORIES
+from data import CATEGORY_COLUMNS, VALUE_COLUMNS, get_pollution, pollution_version
+
+
+# Value column -> the category column that describes it
+CATEGORY_FOR = dict(zip(VALUE_COLUMNS, CATEGORY_COLUMNS))
+RESULT_COLUMNS = ["Country", "City", *VALUE_COLUMNS, *CATEGORY_COLUMNS]
+MAX_LIMIT = 1000
+CACHE_SIZE = 256
+
+
+# A query parameter as a finite number (an int with `integer`) within [low, high], or None when
+# it's absent. Raises ValueError naming the parameter otherwise.
+def _parse_number(name, value, integer=False, low=None, high=None):
+    if value is None or value == "":
+        return None
+    kind = "an integer" if integer else "a number"
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be {kind}") from None
+    if not np.isfinite(number) or (integer and not number.is_integer()):
+        raise ValueError(f"{name} must be {kind}")
+    if (low is not None and number < low) or (high is not None and number > high):
+        limits = f"between {low} and {high}" if low is not None and high is not None else f"at least {low}"
+        raise ValueError(f"{name} must be {limits}")
+    return int(number) if integer else number
+
+
+# Normalized, hashable form of a query; equivalent requests share one cache entry.
+# Raises ValueError for anything the index can't answer.
+def normalize_query(country=None, category=None, column="AQI Value", min_value=None, max_value=None,
+                    limit=100, per_country=None):
+    if column not in VALUE_COLUMNS:
+        raise ValueError(f"column must be one of: {', '.join(VALUE_COLUMNS)}")
+    countries = tuple(sorted({country} if isinstance(country, str) else set(country or ())))
+    categories = tuple(sorted({category} if isinstance(category, str) else set(category or ()), key=str))
+    unknown = [c for c in categories if c not in CATEGORIES]
+    if unknown:
+        raise ValueError(f"unknown category: {', '.join(unknown)}")
+    min_value = _parse_number("min", min_value)
+    max_value = _parse_number("max", max_value)
+    if min_value is not None and max_value is not None and min_value > max_value:
+        raise ValueError("min must not be greater than max")
+    limit = _parse_number("limit", limit, integer=True, low=1, high=MAX_LIMIT)
+    per_country = _parse_number("per_country", per_country, integer=True, low=1)
+    return (countries, categories, column, min_value, max_value, 100 if limit is None else limit, per_country)
+
+
+# Read-only query index over one version of the pollution frame. Rows are sorted by country so
+# each country is a contiguous slice, and every value column has a precomputed sort order.
+class PollutionIndex:
+    def __init__(self, frame):
+        codes = frame["Country"].cat.codes.to_numpy()
+        order = np.argsort(codes, kind="stable")
+        self.frame = frame.iloc[order].reset_index(drop=True)
+        codes = codes[order]
+        names = frame["Country"].cat.categories
+        bounds = np.searchsorted(codes, np.arange(len(names) + 1))
+        self.country_slices = {
+            name: (int(bounds[i]), int(bounds[i + 1]))
+            for i, name in enumerate(names) if bounds[i] < bounds[i + 1]
+        }
+        self.country_codes = codes
+        self.values = {col: self.frame[col].to_numpy() for col in VALUE_COLUMNS}
+        # Ascending row order per column, for range scans and top-N
+        self.orders = {col: np.argsort(values, kind="stable") for col, values in self.values.items()}
+        self.sorted_values = {col: self.values[col][self.orders[col]] for col in VALUE_COLUMNS}
+        self.category_codes = {col: self.frame[col].cat.codes.to_numpy() for col in CATEGORY_COLUMNS}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def countries(self):
+        return sorted(self.country_slices)
+
+    def _rows(self, countries, categories, column, min_value, max_value):
+        if countries:
+            rows = np.concatenate([np.arange(*self.country_slices[c]) for c in countries if c in self.country_slices]
+                                  or [np.array([], dtype=np.int64)])
+            values = self.values[column][rows]
+            mask = np.ones(len(rows), dtype=bool)
+            if min_value is not None:
+                mask &= values >= min_value
+            if max_value is not None:
+                mask &= values <= max_value
+            rows = rows[mask]
+        else:
+            # Value range straight off the sorted order: two binary searches
+            sorted_values = self.sorted_values[column]
+            start = 0 if min_value is None else np.searchsorted(sorted_values, min_value, side="left")
+            stop = len(sorted_values) if max_value is None else np.searchsorted(sorted_values, max_value, side="right")
+            rows = self.orders[column][start:stop]
+        if categories:
+            wanted = [CATEGORIES.index(c) for c in categories]
+            rows = rows[np.isin(self.category_codes[CATEGORY_FOR[column]][rows], wanted)]
+        return rows
+
+    def _run(self, key):
+        countries, categories, column, min_value, max_value, limit, per_country = key
+        rows = self._rows(countries, categories, column, min_value, max_value)
+        # Worst first; stable sort keeps the precomputed order for ties
+        rows = rows[np.argsort(-self.values[column][rows].astype(np.int32), kind="stable")]
+        if per_country:
+            codes = self.country_codes[rows]
+            rank = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+            rows = rows[rank < per_country]
+        total = len(rows)
+        result = self.frame.iloc[rows[:limit]][RESULT_COLUMNS]
+        return total, result
+
+    # Run a query (see normalize_query for parameters); returns (total matches, DataFrame of
+    # at most `limit` rows). Results are memoized per normalized query.
+    def query(self, **params):
+        key = normalize_query(**params)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = self._run(key)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+
+_index = {"version": None, "index": None}
+_index_lock = threading.Lock()
+
+
+# Query index for the current dataset, rebuilt when the dataset changes
+def get_query_index():
+    version = pollution_version()
+    with _index_lock:
+        if _index["version"] != version:
+            _index.update(version=version, index=PollutionIndex(get_pollution()))
+        return _index["index"]
+
+
+# JSON-ready rows: categoricals and numpy scalars become plain strings and ints, NaN becomes null
+def result_records(result):
+    return json.loads(result.to_json(orient="records"))
@@ -0,0 +1,112 @@
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+# Cells a nearest lookup may visit (shells 0-2) before it falls back to scanning every point.
+# Each cell is a dict lookup in Python, while the scan is one matrix-vector product.
+MAX_SEARCH_CELLS = 125
+
+
+def to_unit_vectors(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+# In-memory index over lat/lon points answering nearest-neighbour and bounding-box queries.
+# Nearest lookups hash points into cubic cells on the unit sphere and search outward shell by
+# shell, scanning every point instead when the nearest are further than MAX_SEARCH_CELLS cells
+# reach; chord distance is monotonic in great-circle distance, so results are exact.
+# Bounding boxes use a latitude-sorted order plus a longitude filter on the matching band.
+class SpatialIndex:
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.xyz = to_unit_vectors(self.lat, self.lon)
+        n = len(self.lat)
+        # About one point per cell on a uniform sphere; clustered data just has fuller cells
+        self.cell = max(math.sqrt(4 * math.pi / max(n, 1)), 1e-3)
+        self.cells = {}
+        if n:
+            keys = np.floor(self.xyz / self.cell).astype(np.int64)
+            order = np.lexsort(keys.T[::-1])
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)])
+            stops = np.r_[starts[1:], n]
+            for start, stop in zip(starts, stops):
+                self.cells[tuple(sorted_keys[start])] = order[start:stop]
+        self.max_shell = int(math.ceil(2 / self.cell)) + 1
+        self._shells = {}
+        self.lat_order = np.argsort(self.lat, kind="stable")
+        self.sorted_lat = self.lat[self.lat_order]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _shell(self, r):
+        # Cell offsets at Chebyshev distance exactly r
+        if r not in self._shells:
+            if r == 0:
+                offsets = [(0, 0, 0)]
+            else:
+                span = range(-r, r + 1)
+                offsets = [(dx, dy, dz) for dx in span for dy in span for dz in span
+                           if max(abs(dx), abs(dy), abs(dz)) == r]
+            self._shells[r] = offsets
+        return self._shells[r]
+
+    # Indices and distances (km) of the k points closest to (lat, lon), nearest first
+    def nearest(self, lat, lon, k=1):
+        k = min(k, len(self))
+        if k == 0:
+            return np.array([], dtype=np.int64), np.array([])
+        query = to_unit_vectors(lat, lon)
+        candidates = self._nearby(query, k)
+        if candidates is None:
+            # Far from every point: the dot product with a unit vector orders points by chord
+            # distance, so one matrix-vector product finds the k nearest
+            similarity = self.xyz @ query
+            candidates = np.argpartition(-similarity, k - 1)[:k] if k < len(self) else np.arange(len(self))
+        chords = np.linalg.norm(self.xyz[candidates] - query, axis=1)
+        best = np.argsort(chords, kind="stable")[:k]
+        return candidates[best], chord_to_km(chords[best])
+
+    # Points in the cells around `query` that are sure to include its k nearest, or None when
+    # that would take more than MAX_SEARCH_CELLS cells
+    def _nearby(self, query, k):
+        cx, cy, cz = (int(v) for v in np.floor(query / self.cell))
+        found = []
+        visited = 0
+        for r in range(self.max_shell + 1):
+            visited += 1 if r == 0 else (2 * r + 1) ** 3 - (2 * r - 1) ** 3
+            if visited > min(MAX_SEARCH_CELLS, len(self.cells)):
+                return None
+            for dx, dy, dz in self._shell(r):
+                members = self.cells.get((cx + dx, cy + dy, cz + dz))
+                if members is not None:
+                    found.append(members)
+            if found:
+                candidates = np.concatenate(found)
+                if len(candidates) >= k:
+                    chords = np.linalg.norm(self.xyz[candidates] - query, axis=1)
+                    # Everything within r cells has been seen, so no unseen point can be closer
+                    if np.partition(chords, k - 1)[k - 1] <= r * self.cell:
+                        return candidates
+        return None
+
+    # Indices of points inside [[south, west], [north, east]]; west > east wraps the antimeridian
+    def within_bbox(self, south, west, north, east):
+        start = np.searchsorted(self.sorted_lat, south, side="left")
+        stop = np.searchsorted(self.sorted_lat, north, side="right")
+        band = self.lat_order[start:stop]
+        if east - west >= 360:
+            return band
+        lon = self.lon[band]
+        return band[(lon - west) % 360 <= (east - west) % 360]
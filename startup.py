@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_phases = []
+
+
+# Record how long an initialization step takes, for the startup report
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - start))
+
+
+# [(phase name, seconds)] in the order they ran in this process
+def phases():
+    return list(_phases)
+
+
+# Cumulative import time in seconds of each module imported directly by `module`, measured in a
+# fresh interpreter with -X importtime, plus the init phases that ran there (after warm_up()).
+def measure_startup(module="new"):
+    code = f"import json, startup, {module}; {module}.warm_up(); print(json.dumps(startup.phases()))"
+    env = {**os.environ, "VAYU_POLL_INTERVAL": os.environ.get("VAYU_POLL_INTERVAL", "3600")}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BASE_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    imports, pending = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # One space after the bar plus two per nesting level. Children are listed before their
+        # parent, so depth-1 entries are kept once the top-level entry turns out to be `module`.
+        if not name.startswith("  "):
+            if name.strip() == module:
+                imports += pending
+            pending = []
+        elif not name.startswith("    "):
+            pending.append((name.strip(), int(cumulative) / 1e6))
+    init = [tuple(entry) for entry in json.loads(result.stdout.strip().splitlines()[-1])]
+    return imports, init, total
+
+
+def format_report(imports, init, total=None, top=15):
+    lines = ["Imports (cumulative)"]
+    for name, seconds in sorted(imports, key=lambda item: -item[1])[:top]:
+        lines.append(f"  {seconds * 1000:9.1f} ms  {name}")
+    lines.append("Initialization")
+    for name, seconds in init:
+        lines.append(f"  {seconds * 1000:9.1f} ms  {name}")
+    if total is not None:
+        lines.append(f"Total (interpreter start to warm): {total * 1000:.1f} ms")
+    return "\n".join(lines)
+
+
+# python startup.py: where a cold worker spends its startup time
+if __name__ == "__main__":
+    print(format_report(*measure_startup(*sys.argv[1:2])))
@@ -0,0 +1,38 @@
+import json
+import os
+
+from spatial import SpatialIndex
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIONS_FILE = os.environ.get("VAYU_STATIONS", os.path.join(BASE_DIR, "stations.json"))
+
+
+# Station registry: AirGradient location id, display name and default position.
+# Entries may also set "timeout" as [connect, read] seconds for slow sensors.
+def load_stations(path=STATIONS_FILE):
+    with open(path, encoding="utf-8") as f:
+        stations = json.load(f)
+    for station in stations:
+        station["id"] = str(station["id"])
+        if "timeout" in station:
+            station["timeout"] = tuple(station["timeout"])
+    return stations
+
+
+STATIONS = load_stations()
+STATIONS_BY_ID = {station["id"]: station for station in STATIONS}
+# The first station in the registry drives the dashboard header and cards
+PRIMARY_STATION = STATIONS[0]
+
+# Nearest-station and bounding-box lookups over the registry's default positions
+STATION_INDEX = SpatialIndex([s["lat"] for s in STATIONS], [s["lon"] for s in STATIONS])
+
+
+def nearest_station(lat, lon):
+    (position,), (distance_km,) = STATION_INDEX.nearest(lat, lon, k=1)
+    return STATIONS[position], float(distance_km)
+
+
+def stations_in_bbox(south, west, north, east):
+    return [STATIONS[i] for i in STATION_INDEX.within_bbox(south, west, north, east)]
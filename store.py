@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_PATH = os.environ.get("VAYU_STORE", os.path.join(BASE_DIR, "vayu.sqlite3"))
+
+# Measurements kept per reading; AirGradient field name -> column name
+FIELDS = {"pm02": "pm25", "pm10": "pm10", "atmp": "atmp", "rhum": "rhum"}
+
+# Rollup resolutions in seconds. Days are cut at local midnight (Nepal is UTC+5:45).
+RESOLUTIONS = {"hour": 3600, "day": 86400}
+TZ_OFFSET = int(os.environ.get("VAYU_TZ_OFFSET", str(5 * 3600 + 45 * 60)))
+
+# Raw samples older than this are dropped; the rollups are kept
+RAW_RETENTION_DAYS = int(os.environ.get("VAYU_RAW_RETENTION_DAYS", "90"))
+
+_columns = list(FIELDS.values())
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS readings (
+    station TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    {", ".join(f"{col} REAL" for col in _columns)},
+    PRIMARY KEY (station, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    station TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    {", ".join(f"{col}_n INTEGER, {col}_sum REAL, {col}_min REAL, {col}_max REAL" for col in _columns)},
+    PRIMARY KEY (station, resolution, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS forecasts (
+    station TEXT PRIMARY KEY,
+    bucket INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    forecast TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_states (
+    station TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (station, rule)
+) WITHOUT ROWID;
+"""
+
+# Fold one reading into its hourly/daily bucket without rescanning the raw table
+UPSERT_ROLLUP = f"""
+INSERT INTO rollups (station, resolution, bucket, {", ".join(f"{c}_n, {c}_sum, {c}_min, {c}_max" for c in _columns)})
+VALUES (?, ?, ?, {", ".join("?, ?, ?, ?" for _ in _columns)})
+ON CONFLICT (station, resolution, bucket) DO UPDATE SET
+{",".join(
+    f'''
+    {c}_n = {c}_n + excluded.{c}_n,
+    {c}_sum = coalesce({c}_sum, 0) + coalesce(excluded.{c}_sum, 0),
+    {c}_min = coalesce(min({c}_min, excluded.{c}_min), {c}_min, excluded.{c}_min),
+    {c}_max = coalesce(max({c}_max, excluded.{c}_max), {c}_max, excluded.{c}_max)'''
+    for c in _columns
+)}
+"""
+
+_local = threading.local()
+_prune = {"at": 0.0}
+
+
+def _connect(path=STORE_PATH):
+    # One connection per thread and process; WAL lets readers run while a worker writes
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key == (os.getpid(), path):
+        return conn
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _local.conn, _local.key = conn, (os.getpid(), path)
+    return conn
+
+
+# Unix seconds from an AirGradient ISO timestamp, or None when the reading has none
+def parse_timestamp(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def bucket_start(ts, resolution):
+    size = RESOLUTIONS[resolution]
+    offset = TZ_OFFSET if resolution == "day" else 0
+    return (ts + offset) // size * size - offset
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Append one API snapshot. Returns False if this (station, timestamp) was already stored,
+# so several workers recording the same snapshot only count it once in the rollups.
+# Readings without an upstream timestamp are skipped: there is nothing to deduplicate them on.
+def record(station, data, path=STORE_PATH):
+    ts = parse_timestamp(data.get("timestamp"))
+    if ts is None:
+        return False
+    values = [_as_number(data.get(field)) for field in FIELDS]
+    conn = _connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        inserted = conn.execute(
+            f"INSERT OR IGNORE INTO readings (station, ts, {', '.join(_columns)}) VALUES (?, ?, {', '.join('?' for _ in _columns)})",
+            [station, ts, *values],
+        ).rowcount
+        if inserted:
+            stats = []
+            for value in values:
+                stats += [0, None, None, None] if value is None else [1, value, value, value]
+            for resolution in RESOLUTIONS:
+                conn.execute(UPSERT_ROLLUP, [station, resolution, bucket_start(ts, resolution), *stats])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if inserted and time.time() - _prune["at"] > 3600:
+        prune_raw(path=path)
+    return bool(inserted)
+
+
+# Drop raw samples past the retention window
+def prune_raw(days=RAW_RETENTION_DAYS, path=STORE_PATH):
+    _prune["at"] = time.time()
+    cutoff = int(time.time()) - days * 86400
+    _connect(path).execute("DELETE FROM readings WHERE ts < ?", [cutoff])
+
+
+# Pre-aggregated series (mean/min/max and reading count per bucket) between two unix timestamps
+def rollup_range(station, resolution, start, end, field="pm25", path=STORE_PATH):
+    rows = _connect(path).execute(
+        f"SELECT bucket, {field}_sum / {field}_n, {field}_min, {field}_max, {field}_n FROM rollups "
+        f"WHERE station = ? AND resolution = ? AND bucket >= ? AND bucket <= ? AND {field}_n > 0 ORDER BY bucket",
+        [station, resolution, bucket_start(int(start), resolution), int(end)],
+    ).fetchall()
+    frame = pd.DataFrame(rows, columns=["bucket", field, f"{field}_min", f"{field}_max", f"{field}_n"])
+    frame["time"] = pd.to_datetime(frame["bucket"] + TZ_OFFSET, unit="s")
+    return frame
+
+
+# Pre-aggregated series for the last `span` seconds
+def rollup_series(station, resolution, span, field="pm25", path=STORE_PATH):
+    now = int(time.time())
+    return rollup_range(station, resolution, now - span, now, field, path)
+
+
+# Daily averages for the last `days` days, in local time
+def daily_series(station, days=7, field="pm25", path=STORE_PATH):
+    frame = rollup_series(station, "day", (days - 1) * 86400, field, path)
+    frame["date"] = frame["time"].dt.strftime("%Y-%m-%d")
+    return frame
+
+
+# Raw samples between two unix timestamps
+def raw_series(station, start, end, fields=("pm25",), path=STORE_PATH):
+    rows = _connect(path).execute(
+        f"SELECT ts, {', '.join(fields)} FROM readings WHERE station = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+        [station, int(start), int(end)],
+    ).fetchall()
+    return pd.DataFrame(rows, columns=["ts", *fields])
+
+
+# Latest forecast row for a station: (last hour folded in, model state, forecast), or Nones
+def load_forecast(station, path=STORE_PATH):
+    row = _connect(path).execute(
+        "SELECT bucket, state, forecast FROM forecasts WHERE station = ?", [station]
+    ).fetchone()
+    if row is None:
+        return None, None, None
+    return row[0], json.loads(row[1]), json.loads(row[2])
+
+
+# Save a forecast only if nobody else advanced it past `previous_bucket` meanwhile;
+# returns False when another worker got there first
+def save_forecast(station, previous_bucket, bucket, state, forecast, path=STORE_PATH):
+    conn = _connect(path)
+    payload = [bucket, json.dumps(state), json.dumps(forecast)]
+    if previous_bucket is None:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO forecasts (bucket, state, forecast, station) VALUES (?, ?, ?, ?)",
+            [*payload, station],
+        )
+    else:
+        cursor = conn.execute(
+            "UPDATE forecasts SET bucket = ?, state = ?, forecast = ? WHERE station = ? AND bucket = ?",
+            [*payload, station, previous_bucket],
+        )
+    return cursor.rowcount > 0
+
+
+# Read-modify-write of a station's alert rule states under one write lock, so workers ingesting
+# at the same time can't interleave. `update(states)` gets {rule: state} and returns
+# (new states, result); the result is passed through.
+def update_alert_states(station, update, path=STORE_PATH):
+    conn = _connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("SELECT rule, state FROM alert_states WHERE station = ?", [station]).fetchall()
+        states, result = update({rule: json.loads(state) for rule, state in rows})
+        conn.executemany(
+            "INSERT OR REPLACE INTO alert_states (station, rule, state) VALUES (?, ?, ?)",
+            [(station, rule, json.dumps(state)) for rule, state in states.items()],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return result
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# The app's modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules read these at import time; keep the tests away from the app's own SQLite files
+_scratch = tempfile.mkdtemp(prefix="vayu-tests-")
+os.environ.setdefault("VAYU_STORE", os.path.join(_scratch, "vayu.sqlite3"))
+os.environ.setdefault("VAYU_CACHE_DIR", os.path.join(_scratch, "cache"))
@@ -0,0 +1,164 @@
+import threading
+import time
+
+import pytest
+
+import alerts
+from alerts import CategoryRule, Dispatcher, RiseRule, Rule, SustainedRule
+
+
+START = 1_700_000_000
+
+
+# Stand-in sink that keeps what it was sent
+class MemorySink:
+    name = "memory"
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, alert):
+        self.sent.append(alert)
+
+
+class FailingSink:
+    name = "failing"
+
+    def send(self, alert):
+        raise OSError("unreachable")
+
+
+# Feed (seconds after START, PM2.5) readings through one rule; returns the alerts as
+# (seconds, kind, level) and the final state
+def run(rule, readings, state=None):
+    state = {} if state is None else state
+    fired = []
+    for offset, pm25 in readings:
+        state, alert = rule.evaluate("station", state, START + offset, pm25)
+        if alert is not None:
+            fired.append((alert.ts - START, alert.kind, alert.level))
+    return fired, state
+
+
+def every(step, values, start=0):
+    return [(start + i * step, value) for i, value in enumerate(values)]
+
+
+def test_rule_is_abstract():
+    with pytest.raises(TypeError):
+        Rule("incomplete")
+
+
+def test_category_rule_needs_confirmation():
+    # After the first reading, one Unhealthy-for-Sensitive-Groups reading is not enough;
+    # the second in a row raises
+    fired, state = run(CategoryRule(), every(60, [5, 40, 5, 40, 40]))
+    assert fired == [(240, "raised", 1)]
+    assert state["open"]
+
+
+def test_category_rule_escalates_and_clears():
+    fired, _ = run(CategoryRule(), every(60, [5, 40, 40, 100, 100, 100, 5, 5]))
+    assert fired == [(120, "raised", 1), (240, "raised", 2), (420, "cleared", 0)]
+
+
+def test_category_rule_suppresses_repeats_within_cooldown():
+    rule = CategoryRule(cooldown=3600)
+    fired, state = run(rule, every(60, [5, 40, 40, 5, 5, 40, 40]))
+    # The second episode starts 4 minutes after the first was raised: no new alert, and the
+    # episode stays closed, so its end isn't announced either
+    assert fired == [(120, "raised", 1), (240, "cleared", 0)]
+    assert state["level"] == 1 and not state["open"]
+    fired, _ = run(rule, every(60, [5, 5, 40, 40], start=3600), state)
+    assert fired == [(3780, "raised", 1)]
+
+
+def test_readings_not_newer_than_the_last_are_ignored():
+    rule = CategoryRule(confirm=1)
+    fired, state = run(rule, [(60, 40)])
+    assert fired == [(60, "raised", 1)]
+    before = dict(state)
+    fired, state = run(rule, [(60, 5), (30, 5)], state)
+    assert fired == [] and state == before
+
+
+def test_sustained_rule_waits_for_a_full_window():
+    # Five-minute readings at 80 µg/m³: the average is over the threshold at once, but the
+    # rule only raises once an hour of readings is covered
+    fired, state = run(SustainedRule(), every(300, [80] * 14))
+    assert fired == [(3600, "raised", 1)]
+    assert state["span"] == 3600
+
+
+def test_sustained_rule_clears_below_hysteresis():
+    rule = SustainedRule(threshold=55.5, window=3600)
+    fired, state = run(rule, every(300, [80] * 13))
+    fired, state = run(rule, every(300, [10] * 24, start=3900), state)
+    assert [(kind, level) for _, kind, level in fired] == [("cleared", 0)]
+    assert state["average"] < 55.5 * (1 - alerts.HYSTERESIS)
+
+
+def test_sustained_rule_restarts_after_a_gap():
+    rule = SustainedRule(window=3600)
+    fired, state = run(rule, every(300, [80] * 10))
+    fired, state = run(rule, [(3000 + 7200, 80)], state)
+    assert fired == [] and state["span"] == 0
+
+
+def test_rise_rule_fires_on_a_fast_climb_and_clears_when_flat():
+    rule = RiseRule(rate=30.0, window=900)
+    steady = every(60, [20] * 10)
+    climbing = every(60, [20 + 5 * i for i in range(1, 11)], start=600)
+    flat = every(60, [70] * 60, start=1260)
+    fired, state = run(rule, steady + climbing + flat)
+    kinds = [kind for _, kind, _ in fired]
+    assert kinds == ["raised", "cleared"]
+    raised_at, cleared_at = fired[0][0], fired[1][0]
+    assert 600 < raised_at <= 1200
+    # The smoothed rate decays over the flat stretch until it is under half the threshold
+    assert 1260 < cleared_at < 1260 + 3600
+    assert state["level"] == 0
+
+
+def test_rise_rule_ignores_steady_readings():
+    fired, state = run(RiseRule(), every(60, [35, 36, 35, 34, 35, 36] * 5))
+    assert fired == []
+    assert abs(state["slope"]) < 30
+
+
+def test_evaluate_reading_delivers_through_the_dispatcher():
+    sink = MemorySink()
+    dispatcher = Dispatcher([FailingSink(), sink])
+    station = f"test-{time.monotonic_ns()}"
+    rules = [CategoryRule(confirm=1)]
+    for minute, pm25 in enumerate([5, 40, 40, 5]):
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(START + 60 * minute))
+        alerts.evaluate_reading(station, {"pm02": pm25, "timestamp": timestamp}, rules, dispatcher)
+    # A reading without a timestamp can't be ordered and is skipped
+    assert alerts.evaluate_reading(station, {"pm02": 300}, rules, dispatcher) == []
+    dispatcher.join()
+    # The failing sink doesn't stop the others
+    assert [(alert.station, alert.kind, alert.level) for alert in sink.sent] == [
+        (station, "raised", 1), (station, "cleared", 0),
+    ]
+
+
+def test_slow_sinks_do_not_hold_up_evaluation():
+    release = threading.Event()
+
+    class BlockedSink(MemorySink):
+        def send(self, alert):
+            release.wait(5)
+            super().send(alert)
+
+    sink = BlockedSink()
+    dispatcher = Dispatcher([sink])
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(START))
+    start = time.perf_counter()
+    fired = alerts.evaluate_reading(f"test-{time.monotonic_ns()}", {"pm02": 300, "timestamp": timestamp},
+                                    [CategoryRule(confirm=1)], dispatcher)
+    assert len(fired) == 1 and time.perf_counter() - start < 1
+    assert sink.sent == []
+    release.set()
+    dispatcher.join()
+    assert sink.sent == fired
@@ -0,0 +1,61 @@
+import json
+import math
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from aqi import breakpoint_tables, multi_pollutant_aqi, pm25_aqi
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES_PATH = os.path.join(BASE_DIR, "fixtures", "aqi_cases.json")
+CALCULATOR_JS = os.path.join(BASE_DIR, "assets", "aqi-calculator.js")
+
+with open(CASES_PATH, encoding="utf-8") as f:
+    CASES = json.load(f)["cases"]
+
+# Loads the browser calculator as a CommonJS module and runs every case through it
+NODE_SCRIPT = """
+const calculator = require(process.argv[1]);
+const {cases, tables} = JSON.parse(require("fs").readFileSync(0, "utf8"));
+const results = cases.map(c => calculator.multiPollutantAqi({pm25: c.pm25, pm10: c.pm10}, tables));
+process.stdout.write(JSON.stringify(results));
+"""
+
+
+def as_float(value):
+    return None if value is None or math.isnan(value) else float(value)
+
+
+def assert_matches(result, case):
+    assert result["aqi"] == pytest.approx(case["aqi"], abs=1e-6)
+    assert result["category"] == case["category"]
+    assert result["dominant"] == case["dominant"]
+    assert result["sub_indices"] == pytest.approx(case["sub_indices"], abs=1e-6)
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: f"pm25={case['pm25']},pm10={case['pm10']}")
+def test_python_matches_cases(case):
+    result = multi_pollutant_aqi({"pm25": case["pm25"], "pm10": case["pm10"]})
+    assert_matches({
+        "aqi": as_float(result.aqi),
+        "category": result.category,
+        "dominant": result.dominant,
+        "sub_indices": {name: as_float(value) for name, value in result.sub_indices.items()},
+    }, case)
+
+    pm25 = pm25_aqi(case["pm25"])
+    assert as_float(pm25.aqi) == pytest.approx(case["sub_indices"]["pm25"], abs=1e-6)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_javascript_matches_cases():
+    payload = json.dumps({"cases": CASES, "tables": breakpoint_tables()})
+    output = subprocess.run(["node", "-e", NODE_SCRIPT, CALCULATOR_JS], input=payload,
+                            capture_output=True, text=True, check=True).stdout
+    results = json.loads(output)
+    assert len(results) == len(CASES)
+    for result, case in zip(results, CASES):
+        assert_matches(result, case)
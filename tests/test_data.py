@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import data
+from aqi import INDEX_HIGH, category_codes
+
+
+@pytest.fixture(scope="module")
+def bundled():
+    return data.load_pollution(data.POLLUTION_CSV)
+
+
+def test_bundled_overall_aqi_is_never_below_a_sub_index(bundled):
+    assert not data.audit_pollution(bundled)["AQI Value"].any()
+
+
+def test_bundled_categories_only_disagree_on_upper_breakpoints(bundled):
+    # The published file puts a value sitting exactly on a category's upper breakpoint
+    # (e.g. AQI 150) in the next category up; everything else matches the tables
+    flags = data.audit_pollution(bundled)
+    for value_col, category_col in zip(data.VALUE_COLUMNS, data.CATEGORY_COLUMNS):
+        flagged = bundled.loc[flags[category_col]]
+        assert np.isin(flagged[value_col], INDEX_HIGH).all()
+        published = flagged[category_col].cat.codes.to_numpy()
+        assert (published == category_codes(flagged[value_col]) + 1).all()
+
+
+def test_audit_flags_edited_rows(bundled):
+    frame = bundled.head(100).copy()
+    frame.loc[0, "AQI Value"] = frame.loc[0, "PM2.5 AQI Value"] - 1
+    frame.loc[1, "CO AQI Category"] = "Hazardous"
+    flags = data.audit_pollution(frame)
+    assert flags.loc[0, "AQI Value"]
+    assert flags.loc[1, "CO AQI Category"]
@@ -0,0 +1,20 @@
+import numpy as np
+
+from downsample import minmax_indices
+
+
+def test_short_series_are_kept_whole():
+    assert list(minmax_indices([0, 1, 2], [5, 6, 7], 100)) == [0, 1, 2]
+
+
+def test_output_is_bounded_ordered_and_keeps_spikes():
+    x = np.arange(100_000, dtype=float)
+    y = np.sin(x / 500)
+    y[31_337] = 900
+    y[77_777] = -900
+    y[50_000:50_100] = np.nan
+    kept = minmax_indices(x, y, 400)
+    assert len(kept) <= 400
+    assert np.all(np.diff(kept) > 0)
+    assert {31_337, 77_777} <= set(kept)
+    assert not np.isnan(y[kept]).any()
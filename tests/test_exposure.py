@@ -0,0 +1,44 @@
+import time
+
+import numpy as np
+import pytest
+
+import exposure
+import store
+
+
+def reading(ts, pm25):
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ts)), "pm02": pm25}
+
+
+def test_integrate_skips_gaps():
+    ts = np.array([0, 600, 1200, 1200 + exposure.MAX_GAP + 1, 1200 + exposure.MAX_GAP + 601])
+    result = exposure.integrate(ts, np.full(len(ts), 22.0))
+    assert result.hours == pytest.approx(1800 / 3600)
+    assert result.mean == pytest.approx(22.0)
+
+
+def test_rolling_seed_matches_adding_readings():
+    ts = np.arange(0, 86400, 300) + 1_700_000_000
+    values = 30 + 10 * np.sin(ts / 5000)
+    values[40:60] = np.nan
+    added, seeded = exposure.RollingExposure(3600 * 6), exposure.RollingExposure(3600 * 6)
+    for t, value in zip(ts, values):
+        added.add(t, value)
+    seeded.seed(ts, values)
+    assert (seeded.dose, seeded.covered) == pytest.approx((added.dose, added.covered))
+
+
+def test_rollups_weight_hours_by_their_readings():
+    station = f"test-{time.monotonic_ns()}"
+    # Past the raw retention, so only the hourly rollups answer
+    full_hour = store.bucket_start(int(time.time()) - (store.RAW_RETENTION_DAYS + 10) * 86400, "hour")
+    for minute in range(0, 60, 5):
+        store.record(station, reading(full_hour + minute * 60, 40.0))
+    # One reading in the next hour: a twelfth of an hour at 100 µg/m³, not a whole one
+    store.record(station, reading(full_hour + 3600, 100.0))
+    result = exposure.exposure(station, full_hour, full_hour + 7199)
+    assert result.hours == pytest.approx(1 + 1 / 12)
+    assert result.dose == pytest.approx(40.0 + 100.0 / 12)
+    empty = exposure.exposure(station, full_hour - 86400, full_hour - 3600)
+    assert empty.hours == 0 and empty.mean is None
@@ -0,0 +1,41 @@
+import time
+
+import forecast
+import store
+
+
+# A model that has seen a full day, last fed the hour starting at `bucket`
+def save_model(station, bucket):
+    state = forecast.new_state(50.0)
+    for hour in range(forecast.SEASON):
+        forecast.update_state(state, bucket - (forecast.SEASON - 1 - hour) * 3600, 50.0)
+    store.save_forecast(station, None, bucket, state, forecast.predict(state, bucket))
+
+
+def test_fresh_forecast_starts_at_the_current_hour():
+    station = f"test-{time.monotonic_ns()}"
+    bucket = store.bucket_start(int(time.time()), "hour") - 3600
+    save_model(station, bucket)
+    points = forecast.get_forecast(station, now=bucket + 3600 + 120)
+    assert len(points) == forecast.HORIZON
+    assert points[0][0] == bucket + 3600
+
+
+def test_silent_station_loses_the_hours_already_past():
+    station = f"test-{time.monotonic_ns()}"
+    bucket = store.bucket_start(int(time.time()), "hour") - 3600
+    save_model(station, bucket)
+    # Ten hours and a bit without a reading: only the hours from now on are left
+    now = bucket + 3600 + 10 * 3600 + 1080
+    points = forecast.get_forecast(station, now=now)
+    assert len(points) == forecast.HORIZON - 10
+    assert points[0][0] == store.bucket_start(now, "hour")
+    assert forecast.get_forecast(station, now=bucket + 2 * 86400) == []
+
+
+def test_young_models_have_no_forecast():
+    station = f"test-{time.monotonic_ns()}"
+    state = forecast.new_state(50.0)
+    bucket = store.bucket_start(int(time.time()), "hour")
+    store.save_forecast(station, None, bucket, state, forecast.predict(state, bucket))
+    assert forecast.get_forecast(station) == []
@@ -0,0 +1,32 @@
+import pytest
+
+from query import MAX_LIMIT, normalize_query
+
+
+def test_equivalent_queries_share_a_key():
+    assert normalize_query(country=["Nepal", "India"], limit="20", min_value="150") == \
+        normalize_query(country=["India", "Nepal"], limit=20, min_value=150.0)
+
+
+def test_absent_parameters_take_their_defaults():
+    assert normalize_query(min_value="", max_value=None, limit=None, per_country="") == \
+        ((), (), "AQI Value", None, None, 100, None)
+
+
+@pytest.mark.parametrize("params, message", [
+    ({"limit": 0}, f"limit must be between 1 and {MAX_LIMIT}"),
+    ({"limit": -1}, f"limit must be between 1 and {MAX_LIMIT}"),
+    ({"limit": MAX_LIMIT + 1}, f"limit must be between 1 and {MAX_LIMIT}"),
+    ({"limit": "2.5"}, "limit must be an integer"),
+    ({"limit": "ten"}, "limit must be an integer"),
+    ({"per_country": -5}, "per_country must be at least 1"),
+    ({"per_country": 0}, "per_country must be at least 1"),
+    ({"min_value": "abc"}, "min must be a number"),
+    ({"max_value": "inf"}, "max must be a number"),
+    ({"min_value": 200, "max_value": 100}, "min must not be greater than max"),
+    ({"column": "Ozone"}, "column must be one of"),
+    ({"category": "Awful"}, "unknown category: Awful"),
+])
+def test_invalid_parameters_are_rejected_by_name(params, message):
+    with pytest.raises(ValueError, match=message):
+        normalize_query(**params)
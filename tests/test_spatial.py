@@ -0,0 +1,75 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from spatial import SpatialIndex, chord_to_km, to_unit_vectors
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CITY_COORDS_CSV = os.path.join(BASE_DIR, "city_coords.csv")
+
+
+@pytest.fixture(scope="module")
+def cities():
+    coords = pd.read_csv(CITY_COORDS_CSV, usecols=["lat", "lon"]).dropna()
+    return SpatialIndex(coords["lat"], coords["lon"])
+
+
+# Uniformly spread over the sphere, so most queries land over sea, far from any city
+def random_queries(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.degrees(np.arcsin(rng.uniform(-1, 1, n))), rng.uniform(-180, 180, n)
+
+
+# Distances (km) of the k nearest points, from every point's distance
+def brute_force(index, lat, lon, k):
+    chords = np.linalg.norm(index.xyz - to_unit_vectors(lat, lon), axis=1)
+    return chord_to_km(np.sort(chords)[:k])
+
+
+@pytest.mark.parametrize("k", [1, 5])
+def test_nearest_matches_brute_force(cities, k):
+    lats, lons = random_queries(500)
+    # Also a city's own position, the poles and a point far off Antarctica
+    lats = np.r_[lats, cities.lat[0], 90, -90, -70]
+    lons = np.r_[lons, cities.lon[0], 0, 0, 0]
+    for lat, lon in zip(lats, lons):
+        positions, distances = cities.nearest(lat, lon, k=k)
+        expected = brute_force(cities, lat, lon, k)
+        # Tied points may come back in either order, so compare distances
+        assert len(set(positions)) == k
+        assert distances == pytest.approx(expected, abs=1e-6)
+        assert chord_to_km(np.linalg.norm(cities.xyz[positions] - to_unit_vectors(lat, lon), axis=1)) \
+            == pytest.approx(distances)
+
+
+def test_nearest_is_faster_than_a_full_scan(cities):
+    lats, lons = random_queries(300, seed=1)
+    cities.nearest(lats[0], lons[0])
+    start = time.perf_counter()
+    for lat, lon in zip(lats, lons):
+        cities.nearest(lat, lon)
+    indexed = time.perf_counter() - start
+    start = time.perf_counter()
+    for lat, lon in zip(lats, lons):
+        np.linalg.norm(cities.xyz - to_unit_vectors(lat, lon), axis=1).argmin()
+    scanned = time.perf_counter() - start
+    assert indexed < scanned
+
+
+def test_small_and_empty_indexes():
+    index = SpatialIndex([27.7, 28.2], [85.3, 83.98])
+    positions, distances = index.nearest(27.71, 85.32, k=5)
+    assert list(positions) == [0, 1]
+    assert distances[0] < 3
+    positions, distances = SpatialIndex([], []).nearest(0, 0)
+    assert len(positions) == 0 and len(distances) == 0
+
+
+def test_within_bbox_wraps_the_antimeridian():
+    index = SpatialIndex([0, 0, 0, 50], [179, -179, 0, 179])
+    assert sorted(index.within_bbox(-10, 170, 10, -170)) == [0, 1]
+    assert sorted(index.within_bbox(-90, -180, 90, 180)) == [0, 1, 2, 3]